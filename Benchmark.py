@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import argparse, os, sys, tempfile, time
+
+from src.backend import ArkClient as ac
+from src.backend import ArkClientPayload as acp
+from src.backend import ArkDownloader as ad
+from src.backend.ArkAssetStore import ArkAssetStore
+from src.backend.ArkMockServer import ArkMockServer
+from src.backend.ArkSyncPlanner import ArkSyncPlanner
+from src.utils.OSUtils import FileSystem
+
+
+def get_peak_rss():
+    """Returns the peak resident set size in bytes of this process and its children, `None` if unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return scale * (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def sync(client:ac.ArkClient, local_root:str, store:ArkAssetStore, workers:int):
+    """Syncs the given directory the way the sync task does, and prints the timings of each step."""
+    FileSystem.mkdir(local_root)
+    t = time.time()
+    repo = acp.ArkIntegratedAssetRepo(acp.ArkLocalAssetsRepo(local_root), client.get_repo())
+    t_load = time.time() - t
+
+    t = time.time()
+    plan = ArkSyncPlanner(repo, store).plan()
+    repo.save_index()
+    t_plan = time.time() - t
+
+    t = time.time()
+    downloader = ad.ArkDownloader(client, workers, store=store)
+    failures = plan.execute(downloader)
+    repo.save_index()
+    if store:
+        store.save_index()
+    t_sync = time.time() - t
+
+    done = len(plan.downloads) - len(failures)
+    data_bytes = sum(i.remote.data_size for i in plan.downloads if i not in failures)
+    print(f"Load:     {t_load:.3f} s")
+    print(f"Plan:     {t_plan:.3f} s, {len(plan.checked)} checked, {len(plan.downloads)} to download, "
+          f"{plan.restorable_count} restorable, {plan.fetch_size} bytes to fetch")
+    print(f"Sync:     {t_sync:.3f} s, {done} done, {len(failures)} failed")
+    if done and t_sync > 0:
+        print(f"Speed:    {done / t_sync:.1f} files/s, {data_bytes / t_sync / 1048576:.2f} MB/s")
+    if store:
+        print(f"Store:    {store.hits} hits, {store.misses} misses")
+    for i in downloader.stages:
+        print(f"  {i}")
+
+def run(args:argparse.Namespace):
+    sizes = [s * 1024 for s in args.sizes]
+    file_sizes = [sizes[i % len(sizes)] for i in range(args.files)]
+    print(f"Generating {args.files} files of {args.sizes} KB...")
+    server = ArkMockServer(file_sizes, args.latency, args.bandwidth * 1024, args.error_rate, pack_size=args.pack_size)
+    server.start()
+    temp_root = tempfile.mkdtemp(prefix='ArkBenchmark')
+    try:
+        t = time.time()
+        client = ac.ArkClient(config_source=server.config_source)
+        client.set_current_network_config()
+        client.set_current_version()
+        print(f"Switch:   {time.time() - t:.3f} s")
+
+        store = ArkAssetStore(os.path.join(temp_root, 'store'), args.store_limit * 1048576) \
+            if args.store_limit > 0 else None
+        print("\n[Fresh sync]")
+        sync(client, os.path.join(temp_root, 'a'), store, args.workers)
+        print("\n[Unchanged sync]")
+        sync(client, os.path.join(temp_root, 'a'), store, args.workers)
+        if store:
+            print("\n[Fresh sync from the store]")
+            sync(client, os.path.join(temp_root, 'b'), store, args.workers)
+
+        rss = get_peak_rss()
+        print(f"\nPeak RSS: {rss / 1048576:.1f} MB" if rss is not None else "\nPeak RSS: N/A")
+    finally:
+        server.stop()
+        FileSystem.rm(temp_root)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the sync performance against a local stand-in server.")
+    parser.add_argument('-n', '--files', type=int, default=500, help="number of the files")
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[4, 64, 1024],
+                        help="unzipped file sizes in KB, assigned to the files in turn")
+    parser.add_argument('-w', '--workers', type=int, default=8, help="number of the download workers")
+    parser.add_argument('--latency', type=float, default=0.0, help="delay of each response in seconds")
+    parser.add_argument('--bandwidth', type=int, default=0, help="speed cap per connection in KB/s, 0 for unlimited")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a failed asset response")
+    parser.add_argument('--pack-size', type=int, default=0, help="number of the files in each pack, 0 for no packs")
+    parser.add_argument('--store-limit', type=int, default=1024,
+                        help="size limit of the asset store in MB, 0 for not using a store")
+    run(parser.parse_args())
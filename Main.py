@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2022-2024, Harry Huang
 # @ BSD 3-Clause License
+import multiprocessing
 from src.ArkStudioApp import App
 from src.utils.AnalyUtils import TestRT
 
 
-app = App()
-app.mainloop()
-print(TestRT.get_avg_time_all())
+if __name__ == '__main__':
+    # The guard prevents the worker processes from launching the app again
+    multiprocessing.freeze_support()
+    app = App()
+    app.mainloop()
+    print(TestRT.get_avg_time_all())
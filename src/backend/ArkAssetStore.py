@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, json, shutil, threading
+from collections import OrderedDict
+
+from ..backend import ArkClientPayload as acp
+from ..backend.ArkFileHasher import ArkFileHasher
+from ..utils.Logger import Logger
+from ..utils.OSUtils import FileSystem
+
+
+class ArkAssetStore:
+    """Local content-addressed store of the inflated assets, keyed by their MD5 hex digests.
+
+    The assets are shared across the resource versions and the devices, so a file whose content
+    has been synced before can be restored locally instead of being downloaded again.
+    An asset is hard-linked into the store if the volume supports it, otherwise it is copied, so storing
+    a synced file costs no extra writing in most cases. An asset is always copied out of the store, and
+    since a hard-linked asset is changed if its file in the repository is modified in place by the other tools,
+    a restored asset is verified by its size and MD5, and a corrupted one is dropped from the store.
+    The least recently used assets are evicted once the total size exceeds the limit.
+    """
+
+    __index_file = 'index.json'
+    __file_encoding = 'UTF-8'
+
+    def __init__(self, store_dir:str, size_limit:int):
+        """Initializes an ArkAssetStore instance.
+
+        :param store_dir: The directory to store the assets;
+        :param size_limit: The maximum total size of the stored assets in bytes;
+        """
+        self._store_dir = store_dir
+        self._size_limit = size_limit
+        self._lock = threading.Lock()
+        self._entries:"OrderedDict[str,int]" = OrderedDict() # From the least to the most recently used
+        self._total_size = 0
+        self._hits = 0
+        self._misses = 0
+        self._load_index()
+
+    @property
+    def total_size(self):
+        return self._total_size
+
+    @property
+    def hits(self):
+        """Number of the successful lookups."""
+        return self._hits
+
+    @property
+    def misses(self):
+        """Number of the failed lookups."""
+        return self._misses
+
+    def _get_path(self, md5:str):
+        return os.path.join(self._store_dir, md5[:2], md5)
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self._store_dir, ArkAssetStore.__index_file), 'r',
+                      encoding=ArkAssetStore.__file_encoding) as f:
+                entries = json.load(f)
+            for md5, size in entries:
+                if os.path.isfile(self._get_path(md5)):
+                    self._entries[md5] = size
+                    self._total_size += size
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def save_index(self):
+        """Saves the usage order of the assets, so that it can be restored next time."""
+        with self._lock:
+            try:
+                FileSystem.mkdir(self._store_dir)
+                path = os.path.join(self._store_dir, ArkAssetStore.__index_file)
+                with open(f'{path}.tmp', 'w', encoding=ArkAssetStore.__file_encoding) as f:
+                    json.dump(list(self._entries.items()), f)
+                os.replace(f'{path}.tmp', path)
+            except OSError as arg:
+                Logger.warn(f"AssetStore: Failed to save index, cause: {arg}")
+
+    def contains(self, md5:str):
+        """Returns `True` if the asset of the given MD5 is stored. It does not count as a lookup."""
+        with self._lock:
+            return md5.lower() in self._entries
+
+    def get(self, md5:str, path:str, size:int=None):
+        """Restores the asset of the given MD5 to the given path if it is stored and intact.
+
+        :param md5: The MD5 hex digest of the asset;
+        :param path: The destination file path, which will be replaced atomically;
+        :param size: The expected size of the asset, `None` for not checking the size;
+        :returns: `True` if the asset is restored and verified;
+        :rtype: bool;
+        """
+        md5 = md5.lower()
+        with self._lock:
+            if md5 not in self._entries:
+                self._misses += 1
+                return False
+            self._entries.move_to_end(md5)
+        temp_path = path + acp.ArkLocalAssetsRepo.TEMP_SUFFIX
+        try:
+            FileSystem.mkdir_for(path)
+            FileSystem.rm(temp_path)
+            shutil.copyfile(self._get_path(md5), temp_path)
+            if (size is not None and os.path.getsize(temp_path) != size) or \
+                    ArkFileHasher.hash_file(temp_path) != md5:
+                FileSystem.rm(temp_path)
+                Logger.warn(f"AssetStore: Dropped corrupted asset {md5}")
+                with self._lock:
+                    self._drop(md5)
+                    self._misses += 1
+                return False
+            os.replace(temp_path, path)
+        except OSError as arg:
+            FileSystem.rm(temp_path)
+            Logger.warn(f"AssetStore: Failed to restore {md5}, cause: {arg}")
+            with self._lock:
+                self._misses += 1
+            return False
+        with self._lock:
+            self._hits += 1
+        return True
+
+    def put(self, md5:str, path:str):
+        """Stores the file of the given path as the asset of the given MD5.
+        The file must have been verified to match the MD5.
+
+        :param md5: The MD5 hex digest of the file;
+        :param path: The file path;
+        """
+        md5 = md5.lower()
+        with self._lock:
+            if md5 in self._entries:
+                self._entries.move_to_end(md5)
+                return
+        store_path = self._get_path(md5)
+        try:
+            size = os.path.getsize(path)
+            if size > self._size_limit:
+                return
+            FileSystem.mkdir_for(store_path)
+            FileSystem.rm(f'{store_path}.tmp')
+            ArkAssetStore._link_or_copy(path, f'{store_path}.tmp')
+            os.replace(f'{store_path}.tmp', store_path)
+        except OSError as arg:
+            Logger.warn(f"AssetStore: Failed to store {md5}, cause: {arg}")
+            return
+        with self._lock:
+            if md5 not in self._entries:
+                self._entries[md5] = size
+                self._total_size += size
+            self._evict()
+
+    @staticmethod
+    def _link_or_copy(src:str, dst:str):
+        try:
+            os.link(src, dst)
+        except OSError:
+            # The volume does not support hard links, or the store is on another volume
+            shutil.copyfile(src, dst)
+
+    def _evict(self):
+        while self._total_size > self._size_limit and self._entries:
+            md5, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            FileSystem.rm(self._get_path(md5))
+
+    def _drop(self, md5:str):
+        size = self._entries.pop(md5, None)
+        if size is not None:
+            self._total_size -= size
+            FileSystem.rm(self._get_path(md5))
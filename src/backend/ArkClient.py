@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2022-2024, Harry Huang
 # @ BSD 3-Clause License
-import requests, zipfile
+import os, glob, json, hashlib, threading, time, requests, zipfile
 from io import BytesIO
+from typing import Callable
+from requests.adapters import HTTPAdapter
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from ..backend import ArkClientPayload as acp
+from ..backend.ArkClientCache import ArkClientCache, ArkClientCacheEntry
 from ..utils.AnalyUtils import TestRT
+from ..utils.OSUtils import FileSystem
 
 
 class ArkClientRequestError(OSError):
@@ -12,25 +20,100 @@ class ArkClientRequestError(OSError):
         super().__init__(*args)
 
 
+class ArkClientVerifyError(ArkClientRequestError):
+    def __init__(self, *args:object):
+        super().__init__(*args)
+
+
 class ArkClientStateError(RuntimeError):
     def __init__(self, *args:object):
         super().__init__(*args)
 
 
+class ArkRateLimiter:
+    """Token bucket rate limiter that caps the total speed of the transfers sharing it.
+    The tokens are reserved in the order of the requests, so the concurrent transfers share the cap fairly.
+    """
+    BURST_TIME = 0.5
+
+    def __init__(self, rate:int=0):
+        """Initializes an ArkRateLimiter instance.
+
+        :param rate: The cap in bytes per second, `0` for unlimited;
+        """
+        self._cond = threading.Condition()
+        self._rate = max(0, rate)
+        self._next = time.monotonic()
+        self._generation = 0
+
+    @property
+    def rate(self):
+        """The cap in bytes per second, `0` for unlimited."""
+        return self._rate
+
+    def set_rate(self, rate:int):
+        """Sets the cap. It takes effect immediately, even for the transfers that are waiting.
+
+        :param rate: The cap in bytes per second, `0` for unlimited;
+        """
+        with self._cond:
+            self._rate = max(0, rate)
+            self._next = time.monotonic()
+            self._generation += 1
+            self._cond.notify_all()
+
+    def acquire(self, size:int):
+        """Blocks until the given size of tokens is available.
+
+        :param size: The number of bytes to transfer;
+        """
+        with self._cond:
+            if self._rate <= 0:
+                return
+            # The bucket is full when the reserved time falls behind the burst window
+            start = max(time.monotonic() - ArkRateLimiter.BURST_TIME, self._next)
+            self._next = start + size / self._rate
+            generation = self._generation
+            while generation == self._generation:
+                remaining = start - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+
 class ArkClient:
     """Arknights C/S communication handler."""
     DEFAULT_DEVICE = 'Android'
     CONN_TIMEOUT = 10
+    CHUNK_SIZE = 65536
+    RATE_LIMITER = ArkRateLimiter()
+    """The global rate limiter of the asset downloads."""
 
-    def __init__(self, device:str=DEFAULT_DEVICE):
+    def __init__(self, device:str=DEFAULT_DEVICE, cache_dir:str=None, config_source:str=acp.ArkNetworkConfig.SOURCE):
         """Initializes an ArkClient instance.
 
         :param device: The device tag of the client;
+        :param cache_dir: The directory to cache the fetched configs and lists, `None` for no caching;
+        :param config_source: The URL of the network config;
         """
+        self._config_source:str = config_source
         self._session:requests.Session = requests.Session()
         self._version:acp.ArkVersion = None
         self._config:acp.ArkNetworkConfig = None
         self._device:str = device
+        self._cache:ArkClientCache = ArkClientCache(cache_dir) if cache_dir else None
+        self._repo:acp.ArkRemoteAssetsRepo = None
+        self._repo_res:str = None
+
+    def set_pool_size(self, size:int):
+        """Sets the maximum number of the kept-alive connections per host.
+        It should be no less than the number of the threads that share this client.
+
+        :param size: The connection pool size;
+        """
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
 
     def _fetch_bytes(self, url:str):
         try:
@@ -42,19 +125,76 @@ class ArkClient:
         except requests.RequestException as arg:
             raise ArkClientRequestError(f"Failed to GET binary content: {url}") from arg
 
-    def _fetch_dict(self, url:str):
+    def _fetch_resumable(self, url:str, part_path:str, total:int=None, on_received:"Callable[[int],None]"=None):
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        if total is not None:
+            if offset == total:
+                return
+            if offset > total:
+                os.unlink(part_path)
+                offset = 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
         try:
-            rsp = self._session.get(url, timeout=ArkClient.CONN_TIMEOUT)
-            if rsp.status_code == 200:
-                return dict(rsp.json())
+            with self._session.get(url, headers=headers, timeout=ArkClient.CONN_TIMEOUT, stream=True) as rsp:
+                if rsp.status_code == 206 and \
+                    rsp.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                    mode = 'ab'
+                elif rsp.status_code == 200:
+                    mode = 'wb' # The server ignored the range, so restart from the beginning
+                elif rsp.status_code == 416 and offset:
+                    os.unlink(part_path) # The partial file is not a prefix of the remote file
+                    return self._fetch_resumable(url, part_path, total, on_received)
+                else:
+                    raise ArkClientRequestError(f"{rsp.status_code}: {url}")
+                with open(part_path, mode) as f:
+                    for chunk in rsp.iter_content(ArkClient.CHUNK_SIZE):
+                        ArkClient.RATE_LIMITER.acquire(len(chunk))
+                        f.write(chunk)
+                        if on_received:
+                            on_received(len(chunk))
+        except requests.RequestException as arg:
+            raise ArkClientRequestError(f"Failed to GET binary stream: {url}") from arg
+
+    def _fetch_dict(self, url:str, immutable:bool=False):
+        entry = self._cache.get(url) if self._cache else None
+        if entry and immutable:
+            try:
+                return dict(ArkClient.parse_json(entry.body))
+            except ValueError:
+                entry = None
+        try:
+            rsp = self._session.get(url, headers=entry.get_validators() if entry else None,
+                                    timeout=ArkClient.CONN_TIMEOUT)
+            if rsp.status_code == 304 and entry:
+                body = entry.body
+            elif rsp.status_code == 200:
+                body = bytes(rsp.content)
+                if self._cache:
+                    self._cache.put(url, ArkClientCacheEntry(
+                        body, rsp.headers.get('ETag'), rsp.headers.get('Last-Modified')))
             else:
                 raise ArkClientRequestError(f"{rsp.status_code}: {url}")
+            return dict(ArkClient.parse_json(body))
         except requests.RequestException as arg:
             raise ArkClientRequestError(f"Failed to GET JSON content: {url}") from arg
+        except ValueError as arg:
+            raise ArkClientRequestError(f"Failed to decode JSON content: {url}") from arg
+
+    @staticmethod
+    def parse_json(body:bytes):
+        """Parses the given JSON content, by `orjson` if it is installed, otherwise by the standard `json`.
+
+        :param body: The JSON content in UTF-8;
+        :returns: The parsed object;
+        :raises ValueError: If the content is not valid JSON;
+        """
+        if orjson:
+            return orjson.loads(body)
+        return json.loads(body)
 
     def get_remote_network_config(self):
         """Fetches the network config from the remote."""
-        return acp.ArkNetworkConfig(self._fetch_dict(acp.ArkNetworkConfig.SOURCE))
+        return acp.ArkNetworkConfig(self._fetch_dict(self._config_source))
 
     def get_remote_version(self):
         """Fetches the version info from the remote."""
@@ -84,14 +224,209 @@ class ArkClient:
         else:
             return data
 
+    def download_asset(self, name:str, path:str, data_size:int=None, md5:str=None, unzip:bool=True,
+                       on_received:"Callable[[int],None]"=None):
+        """Fetches a hot-update asset from the remote and writes it to the given path.
+        The data is transferred in chunks, so the memory usage does not grow with the file size.
+        The data is firstly saved to a partial file beside the destination, which will be resumed
+        by the next call if the transfer is interrupted. The destination is replaced atomically
+        only after the whole data has been received.
+        The unzipped data is hashed while being written, so no extra reading is needed to verify it.
+
+        :param name: The name of the asset;
+        :param path: The destination file path;
+        :param data_size: The expected size of the data to receive, `None` for unknown;
+        :param md5: The expected MD5 hex digest of the unzipped data, `None` for no verification;
+        :param unzip: Whether to write the unzipped data;
+        :param on_received: The callback that will be called with the size of each received chunk;
+        :returns: The number of bytes written;
+        :rtype: int;
+        """
+        self.clean_stale_parts(path)
+        part_path = self.fetch_asset_part(name, path, data_size, on_received)
+        if not unzip:
+            size = os.path.getsize(part_path)
+            os.replace(part_path, path)
+            return size
+        size, digest = ArkClient.inflate_part(part_path, path)
+        ArkClient.verify_part(path, digest, md5, part_path)
+        ArkClient.commit_part(path, part_path)
+        return size
+
+    def fetch_asset_part(self, name:str, path:str, data_size:int=None, on_received:"Callable[[int],None]"=None):
+        """Fetches a hot-update asset from the remote to the partial file beside the given path.
+        The partial file will be resumed if it exists. Its name contains the current resource version,
+        so that a partial file left by another version is never resumed against the current one.
+
+        :param name: The name of the asset;
+        :param path: The destination file path;
+        :param data_size: The expected size of the data to receive, `None` for unknown;
+        :param on_received: The callback that will be called with the size of each received chunk;
+        :returns: The path of the partial file;
+        :rtype: str;
+        """
+        if self._config is None:
+            raise ArkClientStateError("Network config is not initialized yet")
+        if self._version is None:
+            raise ArkClientStateError("Version is not initialized yet")
+        part_path = self._get_part_path(path)
+        FileSystem.mkdir_for(path)
+        self._fetch_resumable(
+            f"{self._config.get('hu')}/{self._device}/assets/{self._version.res}/{name}",
+            part_path, data_size, on_received)
+        if data_size is not None:
+            part_size = os.path.getsize(part_path)
+            if part_size != data_size:
+                raise ArkClientRequestError(f"Incomplete data received: {part_size}/{data_size} bytes: {name}")
+        return part_path
+
+    def clean_stale_parts(self, path:str):
+        """Removes the partial files left by the other resource versions, which will never be resumed.
+
+        :param path: The destination file path whose partial files to check,
+                     or a directory whose partial files of all the files inside to check;
+        :returns: The number of the removed partial files;
+        :rtype: int;
+        """
+        if self._version is None:
+            raise ArkClientStateError("Version is not initialized yet")
+        suffix = f'.{self._version.res}{acp.ArkLocalAssetsRepo.PART_SUFFIX}'
+        if os.path.isdir(path):
+            part_paths = (os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs
+                          if f.endswith(acp.ArkLocalAssetsRepo.PART_SUFFIX))
+        else:
+            # Only the parts named after this path and a version are matched, not the ones of the other files
+            prefix_len = len(path) + 1
+            part_paths = [i for i in glob.glob(glob.escape(path) + '.*' + acp.ArkLocalAssetsRepo.PART_SUFFIX)
+                          if '.' not in i[prefix_len:-len(acp.ArkLocalAssetsRepo.PART_SUFFIX)]]
+            part_paths.append(path + acp.ArkLocalAssetsRepo.PART_SUFFIX) # The part named before the versions
+        count = 0
+        with TestRT('client_clean_parts'):
+            for i in part_paths:
+                if not i.endswith(suffix) and os.path.isfile(i):
+                    try:
+                        os.unlink(i)
+                        count += 1
+                    except OSError:
+                        pass
+        return count
+
+    def _get_part_path(self, path:str):
+        # The resource version is included, since it is a part of the URL of the asset
+        return f'{path}.{self._version.res}{acp.ArkLocalAssetsRepo.PART_SUFFIX}'
+
+    @staticmethod
+    def inflate_part(part_path:str, path:str):
+        """Inflates the single entry of the given fetched partial file into the temporary file of the given path,
+        hashing the inflated data meanwhile. This method is CPU-bound and does not access the client,
+        so it can be run in another process.
+
+        :param part_path: The path of the partial file returned by `fetch_asset_part`;
+        :param path: The destination file path;
+        :returns: The inflated size and the MD5 hex digest of the inflated data;
+        :rtype: tuple[int,str];
+        """
+        try:
+            with TestRT('client_unzip_stream'):
+                with zipfile.ZipFile(part_path) as zf:
+                    nl = zf.namelist()
+                    if len(nl) != 1:
+                        raise ArkClientStateError("Zipfile contains unexpected entry length")
+                    return ArkClient._inflate_entry(zf, nl[0], path)
+        except (zipfile.BadZipFile, ArkClientStateError):
+            ArkClient.discard_part(path, part_path)
+            raise
+
+    @staticmethod
+    def inflate_pack_members(pack_path:str, members:"list[tuple[str,str]]"):
+        """Inflates the given members of the fetched pack archive into the temporary files of their paths,
+        hashing the inflated data meanwhile. The archive is opened once and the members are read in the order
+        of their offsets. The archive is left untouched, so that its other members can be inflated concurrently.
+        This method can be run in another process like `inflate_part`.
+
+        :param pack_path: The path of the fetched pack archive;
+        :param members: The names of the members, which are the names of the assets, and their destination paths;
+        :returns: The inflated sizes and the MD5 hex digests of the members in order, `None` for a missing member;
+        :rtype: list[tuple[int,str]|None];
+        """
+        rst:"list[tuple[int,str]|None]" = [None] * len(members)
+        try:
+            with TestRT('client_unzip_pack'):
+                with zipfile.ZipFile(pack_path) as zf:
+                    name2entry = {i.filename: i for i in zf.infolist()}
+                    found = [i for i, (m, _) in enumerate(members) if m in name2entry]
+                    for i in sorted(found, key=lambda x:name2entry[members[x][0]].header_offset):
+                        member, path = members[i]
+                        FileSystem.mkdir_for(path)
+                        rst[i] = ArkClient._inflate_entry(zf, name2entry[member], path)
+        except zipfile.BadZipFile:
+            for _, path in members:
+                FileSystem.rm(path + acp.ArkLocalAssetsRepo.TEMP_SUFFIX)
+            raise
+        return rst
+
+    @staticmethod
+    def _inflate_entry(zf:zipfile.ZipFile, entry:"str|zipfile.ZipInfo", path:str):
+        digest = hashlib.md5()
+        with zf.open(entry) as src, open(path + acp.ArkLocalAssetsRepo.TEMP_SUFFIX, 'wb') as dst:
+            while True:
+                chunk = src.read(ArkClient.CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dst.write(chunk)
+            return dst.tell(), digest.hexdigest()
+
+    @staticmethod
+    def verify_part(path:str, digest:str, md5:str=None, part_path:str=None):
+        """Verifies the inflated temporary file of the given path. It will be discarded if mismatched.
+
+        :param path: The destination file path;
+        :param digest: The MD5 hex digest of the inflated data;
+        :param md5: The expected MD5 hex digest, `None` for no verification;
+        :param part_path: The partial file to discard as well if mismatched, `None` for none;
+        """
+        if md5 is not None and digest != md5.lower():
+            ArkClient.discard_part(path, part_path)
+            raise ArkClientVerifyError(f"MD5 mismatched: {digest} (expected {md5}): {path}")
+
+    @staticmethod
+    def commit_part(path:str, part_path:str=None):
+        """Replaces the given path with its inflated temporary file atomically, and removes its partial file if any.
+
+        :param path: The destination file path;
+        :param part_path: The partial file to remove, `None` for none;
+        """
+        os.replace(path + acp.ArkLocalAssetsRepo.TEMP_SUFFIX, path)
+        if part_path:
+            FileSystem.rm(part_path)
+
+    @staticmethod
+    def discard_part(path:str, part_path:str=None):
+        """Removes the given partial file and the temporary file of the given path,
+        so that the corrupted data will not be resumed next time.
+
+        :param path: The destination file path;
+        :param part_path: The partial file to remove, `None` for none;
+        """
+        if part_path:
+            FileSystem.rm(part_path)
+        FileSystem.rm(path + acp.ArkLocalAssetsRepo.TEMP_SUFFIX)
+
     def get_repo(self):
-        """Fetches the remote asset repository info from the remote."""
+        """Fetches the remote asset repository info from the remote.
+        The list of a resource version never changes, so it is reused if it has been fetched before.
+        """
         if self._config is None:
             raise ArkClientStateError("Network config is not initialized yet")
         if self._version is None:
             raise ArkClientStateError("Version is not initialized yet")
-        return acp.ArkRemoteAssetsRepo(self._fetch_dict(
-            f"{self._config.get('hu')}/{self._device}/assets/{self._version.res}/hot_update_list.json"))
+        if self._repo is None or self._repo_res != self._version.res:
+            self._repo = acp.ArkRemoteAssetsRepo(self._fetch_dict(
+                f"{self._config.get('hu')}/{self._device}/assets/{self._version.res}/hot_update_list.json",
+                immutable=True))
+            self._repo_res = self._version.res
+        return self._repo
 
     def set_current_network_config(self, config:acp.ArkNetworkConfig=None):
         """Sets the network config of the client.
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, json, hashlib, threading
+
+from ..utils.Logger import Logger
+from ..utils.OSUtils import FileSystem
+
+
+class ArkClientCacheEntry:
+    """Cached response record."""
+
+    def __init__(self, body:bytes, etag:str=None, last_modified:str=None):
+        self._body = body
+        self._etag = etag
+        self._last_modified = last_modified
+
+    @property
+    def body(self):
+        """The response body."""
+        return self._body
+
+    @property
+    def etag(self):
+        """The `ETag` header of the response, `None` if absent."""
+        return self._etag
+
+    @property
+    def last_modified(self):
+        """The `Last-Modified` header of the response, `None` if absent."""
+        return self._last_modified
+
+    def get_validators(self):
+        """Returns the headers that make a conditional request against this entry."""
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+        return headers
+
+
+class ArkClientCache:
+    """Persistent on-disk cache of the remote responses, keyed by URL."""
+
+    __file_encoding = 'UTF-8'
+
+    def __init__(self, cache_dir:str):
+        """Initializes an ArkClientCache instance.
+
+        :param cache_dir: The directory to store the cached responses;
+        """
+        self._cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def _get_path(self, url:str):
+        key = hashlib.sha1(url.encode(ArkClientCache.__file_encoding)).hexdigest()
+        return os.path.join(self._cache_dir, key)
+
+    def get(self, url:str):
+        """Gets the cached response of the given URL.
+
+        :param url: The URL;
+        :returns: The cached entry, `None` if not cached;
+        :rtype: ArkClientCacheEntry|None;
+        """
+        path = self._get_path(url)
+        with self._lock:
+            try:
+                with open(f'{path}.json', 'r', encoding=ArkClientCache.__file_encoding) as f:
+                    meta = json.load(f)
+                if meta.get('url') != url:
+                    return None
+                with open(f'{path}.bin', 'rb') as f:
+                    body = f.read()
+                if len(body) != meta.get('size'):
+                    return None
+                return ArkClientCacheEntry(body, meta.get('etag'), meta.get('last_modified'))
+            except (OSError, ValueError):
+                return None
+
+    def put(self, url:str, entry:ArkClientCacheEntry):
+        """Puts a response of the given URL into the cache.
+
+        :param url: The URL;
+        :param entry: The response to cache;
+        """
+        path = self._get_path(url)
+        meta = {
+            'url': url,
+            'size': len(entry.body),
+            'etag': entry.etag,
+            'last_modified': entry.last_modified
+        }
+        with self._lock:
+            try:
+                FileSystem.mkdir(self._cache_dir)
+                with open(f'{path}.bin.tmp', 'wb') as f:
+                    f.write(entry.body)
+                with open(f'{path}.json.tmp', 'w', encoding=ArkClientCache.__file_encoding) as f:
+                    json.dump(meta, f)
+                os.replace(f'{path}.bin.tmp', f'{path}.bin')
+                os.replace(f'{path}.json.tmp', f'{path}.json')
+            except OSError as arg:
+                Logger.warn(f"ClientCache: Failed to cache {url}, cause: {arg}")
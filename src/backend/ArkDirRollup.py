@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import threading
+
+from ..backend import ArkClientPayload as acp
+from ..utils.AnalyUtils import TestRT
+
+
+class ArkDirStats:
+    """Aggregated statistics of the files in a directory, including the files in its subdirectories."""
+    __slots__ = ('file_count', 'total_size', 'local_size', 'remote_size', 'download_size', 'status_counts')
+    _STATUS_NUM = 8
+
+    def __init__(self):
+        self.file_count = 0
+        self.total_size = 0
+        """Total of the `file_size` of the files."""
+        self.local_size = 0
+        self.remote_size = 0
+        self.download_size = 0
+        """Total size of the data to download for the added and the modified files."""
+        self.status_counts = [0] * ArkDirStats._STATUS_NUM
+        """Numbers of the files of each status, indexed by the `FileStatus` values."""
+
+    @property
+    def changed_count(self):
+        """Number of the files to add, modify or delete."""
+        c = self.status_counts
+        return c[acp.FileStatus.ADD] + c[acp.FileStatus.MODIFY] + c[acp.FileStatus.DELETE]
+
+    def _add(self, other:"ArkDirStats|tuple[int,int,int,int,int]", sign:int=1):
+        if isinstance(other, ArkDirStats):
+            self.file_count += sign * other.file_count
+            self.total_size += sign * other.total_size
+            self.local_size += sign * other.local_size
+            self.remote_size += sign * other.remote_size
+            self.download_size += sign * other.download_size
+            for i, n in enumerate(other.status_counts):
+                self.status_counts[i] += sign * n
+        else:
+            total_size, local_size, remote_size, download_size, status = other
+            self.file_count += sign
+            self.total_size += sign * total_size
+            self.local_size += sign * local_size
+            self.remote_size += sign * remote_size
+            self.download_size += sign * download_size
+            if 0 <= status < ArkDirStats._STATUS_NUM:
+                self.status_counts[status] += sign
+
+    def __repr__(self):
+        return f"DirStats[{self.file_count} files, {self.changed_count} changed]"
+
+
+class ArkDirRollup:
+    """Rollup of the statistics of every directory in a repository.
+
+    All the directories are aggregated in one bottom-up pass over the path index,
+    and then updated incrementally along the ancestors of each changed file.
+    The statuses are read from `cached_status`, so no file is hashed for the rollup.
+    """
+
+    def __init__(self, trie:acp.AssetPathTrie):
+        """Initializes an ArkDirRollup instance, aggregating all the directories of the given path index.
+
+        :param trie: The path index of the repository;
+        """
+        self._lock = threading.Lock()
+        self._stats:"dict[str,ArkDirStats]" = {}
+        self._contribs:"dict[str,tuple[int,int,int,int,int]]" = {} # The contributions of the files as of last time
+        with TestRT('dir_rollup_build'):
+            # The deeper directories are aggregated first, so each directory is visited once
+            for d in sorted(trie.dirs, key=lambda x:-x.name.count(acp.FileInfoBase.SEP) if x.name else 1):
+                stats = self._stats.setdefault(d.name, ArkDirStats())
+                for c in trie.get_children(d):
+                    if isinstance(c, acp.DirFileInfo):
+                        stats._add(self._stats[c.name])
+                    else:
+                        contrib = ArkDirRollup._get_contrib(c)
+                        self._contribs[c.name] = contrib
+                        stats._add(contrib)
+
+    def get(self, info:acp.FileInfoBase):
+        """Returns the statistics of the given directory, `None` if not found.
+
+        :param info: The directory;
+        :rtype: ArkDirStats|None;
+        """
+        return self._stats.get(info.name, None)
+
+    def update(self, info:acp.FileInfoBase):
+        """Updates the statistics after the given file is added or changed.
+
+        :param info: The file;
+        """
+        with self._lock:
+            self._apply(info.name, ArkDirRollup._get_contrib(info))
+
+    def remove(self, info:acp.FileInfoBase):
+        """Updates the statistics after the given file is removed.
+
+        :param info: The file;
+        """
+        with self._lock:
+            self._apply(info.name, None)
+
+    def _apply(self, name:str, contrib:"tuple[int,int,int,int,int]|None"):
+        old = self._contribs.pop(name, None)
+        if contrib is not None:
+            self._contribs[name] = contrib
+        if old == contrib:
+            return
+        parent = name
+        while parent:
+            parent = parent.rpartition(acp.FileInfoBase.SEP)[0]
+            stats = self._stats.get(parent, None)
+            if stats is None:
+                stats = self._stats[parent] = ArkDirStats()
+            if old is not None:
+                stats._add(old, -1)
+            if contrib is not None:
+                stats._add(contrib)
+            if parent and stats.file_count == 0:
+                del self._stats[parent]
+
+    @staticmethod
+    def _get_contrib(info:acp.FileInfoBase):
+        status = info.cached_status
+        if isinstance(info, acp.ArkIntegratedFileInfo):
+            local_size = info.local.file_size
+            remote = info.remote
+            if remote is None:
+                return (local_size, local_size, 0, 0, status)
+            remote_size = remote.file_size
+            download_size = remote.data_size if status in (acp.FileStatus.ADD, acp.FileStatus.MODIFY) else 0
+            return (remote_size, local_size, remote_size, download_size, status)
+        if isinstance(info, acp.ArkRemoteFileInfo):
+            return (info.file_size, 0, info.file_size, 0, status)
+        return (info.file_size, info.file_size, 0, 0, status)
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from ..backend import ArkClient as ac
+from ..backend import ArkClientPayload as acp
+from ..backend.ArkAssetStore import ArkAssetStore
+from ..backend.ArkPipeline import ArkPipeline, ArkPipelineStage
+from ..utils.AnalyUtils import TestRT
+from ..utils.Config import Config, PerformanceLevel
+from ..utils.Logger import Logger
+from ..utils.OSUtils import FileSystem
+
+
+class ArkDownloadError(OSError):
+    def __init__(self, failures:"dict[acp.ArkIntegratedFileInfo,BaseException]", *args:object):
+        super().__init__(*args)
+        self.failures = failures
+
+
+class ArkDownloadProgress:
+    """Aggregated progress record of a batch download.
+    The progress is weighted by the data sizes, so a huge file counts more than a tiny file.
+    """
+
+    def __init__(self, total:int, total_bytes:int):
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._total = total
+        self._total_bytes = total_bytes
+        self._done = 0
+        self._failed = 0
+        self._handled_bytes = 0
+        self._received_bytes = 0
+
+    def _on_received(self, size:int):
+        with self._lock:
+            self._handled_bytes += size
+            self._received_bytes += size
+
+    def _on_skipped(self, size:int):
+        with self._lock:
+            self._handled_bytes += size
+
+    def _on_file_done(self, size:int, received:int):
+        with self._lock:
+            self._done += 1
+            self._handled_bytes += size - received
+
+    def _on_file_failed(self, size:int, received:int):
+        with self._lock:
+            self._failed += 1
+            self._handled_bytes += size - received
+
+    @property
+    def total(self):
+        """Number of the files to download."""
+        return self._total
+
+    @property
+    def total_bytes(self):
+        """Sum of the data sizes of the files to download."""
+        return self._total_bytes
+
+    @property
+    def done(self):
+        """Number of the files that have been downloaded successfully."""
+        return self._done
+
+    @property
+    def failed(self):
+        """Number of the files that failed to download."""
+        return self._failed
+
+    @property
+    def finished(self):
+        """Number of the files that have been handled, no matter succeeded or failed."""
+        return self._done + self._failed
+
+    @property
+    def handled_bytes(self):
+        """Sum of the data sizes that have been received, skipped or given up."""
+        return self._handled_bytes
+
+    @property
+    def received_bytes(self):
+        """Sum of the data sizes that have been received through the network."""
+        return self._received_bytes
+
+    @property
+    def ratio(self):
+        """Overall progress weighted by the data sizes, in [0.0, 1.0]."""
+        if self._total_bytes:
+            return min(1.0, self._handled_bytes / self._total_bytes)
+        return self.finished / self._total if self._total else 1.0
+
+    @property
+    def speed(self):
+        """Average receiving speed in bytes per second."""
+        elapsed = time.time() - self._start_time
+        return self._received_bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated remaining time in seconds, `None` if it cannot be estimated yet."""
+        speed = self.speed
+        if speed <= 0:
+            return None
+        return max(0, self._total_bytes - self._handled_bytes) / speed
+
+    def __repr__(self):
+        return f"DownloadProgress({self.finished}/{self._total}, {self._failed} failed)"
+
+
+class ArkDownloadScheduler:
+    """Download order planner that shortens the total time of a batch download.
+
+    The files are sorted by their priority classes first, then by their data sizes in descending order.
+    Since each idle worker takes the next file in the order, the longest files are assigned to the
+    least-loaded workers, so that a few huge files will not stretch the tail of the batch.
+    """
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+
+    def __init__(self, priority_of:"Callable[[acp.ArkIntegratedFileInfo],int]"=None):
+        """Initializes an ArkDownloadScheduler instance.
+
+        :param priority_of: The function that returns the priority class of a file, lower for earlier.
+                            If `None`, all the files are of normal priority;
+        """
+        self._priority_of = priority_of if priority_of else lambda _:ArkDownloadScheduler.PRIORITY_NORMAL
+
+    def order(self, infos:"list[acp.ArkIntegratedFileInfo]"):
+        """Returns a new list of the given files in the scheduled order."""
+        return sorted(infos, key=lambda x:(self._priority_of(x), -x.remote.data_size))
+
+    @staticmethod
+    def prefer(names:"Iterable[str]"):
+        """Returns a scheduler that gives high priority to the files of the given names,
+        as well as the files inside the directories of the given names.
+        """
+        prefixes = tuple(f'{n}{acp.FileInfoBase.SEP}' for n in names if n)
+        names = set(names)
+        def priority_of(info:acp.ArkIntegratedFileInfo):
+            if info.name in names or info.name.startswith(prefixes):
+                return ArkDownloadScheduler.PRIORITY_HIGH
+            return ArkDownloadScheduler.PRIORITY_NORMAL
+        return ArkDownloadScheduler(priority_of)
+
+
+class _DownloadJob:
+    def __init__(self, info:acp.ArkIntegratedFileInfo, pack:"_PackJob"=None):
+        self.info = info
+        self.pack = pack
+        self.weight = 0 if pack else info.remote.data_size # The bytes counted in the progress
+        self.received = 0
+        self.part_path:str = None
+        self.size = 0
+        self.digest:str = None
+        self.error:Exception = None # The error occurred in a stage that handles a batch of jobs
+        self.restored = False
+
+    @property
+    def data_size(self):
+        return self.info.remote.data_size
+
+
+class _PackJob:
+    def __init__(self, pack:acp.ArkPackInfo, infos:"list[acp.ArkIntegratedFileInfo]"):
+        self.pack = pack
+        self.members = [_DownloadJob(i, self) for i in infos]
+        self.path = os.path.join(infos[0].local.root_dir, pack.data_name)
+        self.part_path:str = None
+        self.received = 0
+        self._pending = len(self.members)
+        self._lock = threading.Lock()
+
+    def release(self):
+        # The pack archive is removed once all its members are handled
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0 and self.part_path:
+                FileSystem.rm(self.part_path)
+
+
+class _PackBatch:
+    # The members of a pack to inflate in one pass, so that the pack archive is opened once for them
+    def __init__(self, pack:_PackJob, members:"list[_DownloadJob]"):
+        self.pack = pack
+        self.members = members
+
+    @property
+    def data_size(self):
+        return sum(m.data_size for m in self.members)
+
+
+class ArkDownloader:
+    """Concurrent hot-update asset downloader.
+
+    Each file goes through a pipeline of four stages, which are fetching, inflating, verifying and writing.
+    The stages have their own workers and are connected by bounded queues, so the network, the CPU and
+    the disk are kept busy at the same time. Inflating is run in a process pool to get around the GIL.
+    Since the inflated data is hashed and written to a temporary file while being inflated,
+    the verifying stage only compares the digests and the writing stage only commits the temporary file.
+
+    If the files to download make up the most of a pack, the pack archive is fetched once instead,
+    and its members are inflated from it concurrently, which saves a great number of requests.
+    """
+    REPORT_INTERVAL = 0.5
+    PACK_RATIO = 0.5
+    """Minimum ratio of the needed bytes to the data size of a pack, for the pack to be fetched as a whole."""
+
+    def __init__(self,
+                 client:ac.ArkClient,
+                 max_workers:int=None,
+                 scheduler:ArkDownloadScheduler=None,
+                 inflate_workers:int=None,
+                 inflate_in_process:bool=True,
+                 store:ArkAssetStore=None,
+                 use_packs:bool=True):
+        """Initializes an ArkDownloader instance.
+
+        :param client: The client to download with, whose network config and version must be initialized;
+        :param max_workers: The number of the fetching workers. If `None`, it is decided by the performance level;
+        :param scheduler: The scheduler that decides the download order. If `None`, a default one is used;
+        :param inflate_workers: The number of the inflating workers. If `None`, it is decided by the CPU count;
+        :param inflate_in_process: Whether to inflate in a process pool rather than a thread pool;
+        :param store: The content-addressed store to look up before fetching and to fill after writing,
+                      `None` for not using a store;
+        :param use_packs: Whether to fetch the pack archives when most of their members are needed;
+        """
+        if max_workers is None:
+            max_workers = PerformanceLevel.get_thread_limit(Config.get('performance_level'))
+        if inflate_workers is None:
+            inflate_workers = min(max_workers, os.cpu_count() or 1)
+        self._client = client
+        self._max_workers = max(1, max_workers)
+        self._inflate_workers = max(1, inflate_workers)
+        self._inflate_in_process = inflate_in_process
+        self._scheduler = scheduler if scheduler else ArkDownloadScheduler()
+        self._store = store
+        self._use_packs = use_packs
+        self._stages:"list[ArkPipelineStage]" = []
+        self._client.set_pool_size(self._max_workers)
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def plan_packs(self, infos:"list[acp.ArkIntegratedFileInfo]", packs:"list[acp.ArkPackInfo]"):
+        """Decides which packs should be fetched as a whole, by comparing the needed bytes of their members
+        with their data sizes.
+
+        :param infos: The files to download;
+        :param packs: The packs of the remote repository;
+        :returns: The chosen packs and their members to download;
+        :rtype: dict[ArkPackInfo,list[ArkIntegratedFileInfo]];
+        """
+        if not self._use_packs:
+            return {}
+        return ArkDownloader.choose_packs(infos, packs)
+
+    @staticmethod
+    def choose_packs(infos:"list[acp.ArkIntegratedFileInfo]", packs:"list[acp.ArkPackInfo]"):
+        """Decides which packs are worth fetching as a whole regardless of the downloader settings,
+        see `plan_packs`.
+
+        :rtype: dict[ArkPackInfo,list[ArkIntegratedFileInfo]];
+        """
+        if not packs:
+            return {}
+        name2pack = {p.name: p for p in packs}
+        pack2infos:"dict[acp.ArkPackInfo,list[acp.ArkIntegratedFileInfo]]" = {}
+        for i in infos:
+            p = name2pack.get(i.remote.pack, None)
+            if p:
+                pack2infos.setdefault(p, []).append(i)
+        return {p: l for p, l in pack2infos.items()
+                if len(l) > 1 and sum(i.remote.data_size for i in l) >= p.data_size * ArkDownloader.PACK_RATIO}
+
+    @property
+    def stages(self):
+        """The pipeline stages of the running or the last download, whose counters can be inspected."""
+        return self._stages
+
+    def download(self,
+                 infos:"list[acp.ArkIntegratedFileInfo]",
+                 on_progress:"Callable[[ArkDownloadProgress],None]"=None,
+                 is_cancelled:"Callable[[],bool]"=None,
+                 packs:"list[acp.ArkPackInfo]"=None):
+        """Downloads the given files to their local paths concurrently.
+        A failed file will not abort the others. The failures are returned after all the files are handled.
+        The partial files left by the other resource versions in the repository are removed beforehand.
+
+        :param infos: The files to download, each of which must have a remote file info;
+        :param on_progress: The callback that will be called in the calling thread periodically
+                            and once a file is handled;
+        :param is_cancelled: The callback that returns `True` if the pending files should be skipped;
+        :param packs: The packs of the remote repository, `None` for fetching all the files one by one;
+        :returns: The failed files and their exceptions;
+        :rtype: dict[ArkIntegratedFileInfo,BaseException];
+        """
+        pack2infos = self.plan_packs(infos, packs)
+        info2pack = {i: p for p, l in pack2infos.items() for i in l}
+        pack2job = {p: _PackJob(p, l) for p, l in pack2infos.items()}
+        progress = ArkDownloadProgress(len(infos), sum(i.remote.data_size for i in infos if i not in info2pack) +
+                                       sum(p.data_size for p in pack2infos))
+        failures:"dict[acp.ArkIntegratedFileInfo,BaseException]" = {}
+
+        def iter_jobs():
+            # A pack takes the place of its first member in the scheduled order
+            for i in self._scheduler.order(infos):
+                p = info2pack.get(i, None)
+                if p is None:
+                    yield _DownloadJob(i)
+                elif p in pack2job:
+                    yield pack2job.pop(p)
+
+        def restore(job:_DownloadJob):
+            if self._store and self._store.get(job.info.remote.md5, job.info.local.path, job.info.remote.file_size):
+                job.restored = True
+                job.size = job.info.remote.file_size
+            return job.restored
+
+        def fetch(job:"_DownloadJob|_PackJob"):
+            if is_cancelled and is_cancelled():
+                raise InterruptedError("Cancelled")
+            if isinstance(job, _PackJob):
+                return fetch_pack(job)
+            if restore(job):
+                return [job]
+            def on_received(size:int):
+                job.received += size
+                progress._on_received(size)
+            job.part_path = self._client.fetch_asset_part(job.info.remote.data_name, job.info.local.path,
+                                                          job.info.remote.data_size, on_received)
+            return [job]
+
+        def fetch_pack(job:_PackJob):
+            if not all([restore(m) for m in job.members]):
+                def on_received(size:int):
+                    job.received += size
+                    progress._on_received(size)
+                job.part_path = self._client.fetch_asset_part(job.pack.data_name, job.path, job.pack.data_size,
+                                                              on_received)
+            progress._on_skipped(job.pack.data_size - job.received)
+            # The members are split into one batch per inflating worker
+            rst:"list[_DownloadJob|_PackBatch]" = [m for m in job.members if m.restored]
+            pending = [m for m in job.members if not m.restored]
+            n = min(self._inflate_workers, len(pending))
+            rst.extend(_PackBatch(job, pending[i * len(pending) // n:(i + 1) * len(pending) // n]) for i in range(n))
+            return rst
+
+        def inflate(job:"_DownloadJob|_PackBatch"):
+            if isinstance(job, _PackBatch):
+                rsts = inflater.submit(ac.ArkClient.inflate_pack_members, job.pack.part_path,
+                                       [(m.info.name, m.info.local.path) for m in job.members]).result()
+                for m, r in zip(job.members, rsts):
+                    if r is None:
+                        m.error = ac.ArkClientStateError(f"Pack does not contain the member: {m.info.name}")
+                    else:
+                        m.size, m.digest = r
+                return job.members
+            if not job.restored:
+                job.size, job.digest = inflater.submit(ac.ArkClient.inflate_part, job.part_path,
+                                                       job.info.local.path).result()
+            return [job]
+
+        def verify(job:_DownloadJob):
+            if job.error:
+                raise job.error
+            if job.restored:
+                return job
+            ac.ArkClient.verify_part(job.info.local.path, job.digest, job.info.remote.md5, job.part_path)
+            return job
+
+        def write(job:_DownloadJob):
+            if not job.restored:
+                ac.ArkClient.commit_part(job.info.local.path, job.part_path)
+                if self._store:
+                    self._store.put(job.info.remote.md5, job.info.local.path)
+            job.info.mark_verified()
+            progress._on_file_done(job.weight, job.received)
+            if job.pack:
+                job.pack.release()
+            return job
+
+        def on_failed(job:"_DownloadJob|_PackJob|_PackBatch", arg:BaseException):
+            if isinstance(job, _PackBatch):
+                for m in job.members:
+                    on_failed(m, arg)
+                return
+            if isinstance(job, _PackJob):
+                # The partial pack archive is kept, so that it can be resumed next time
+                progress._on_skipped(job.pack.data_size - job.received)
+                for m in job.members:
+                    if m.restored:
+                        m.info.mark_verified()
+                        progress._on_file_done(m.weight, m.received)
+                    else:
+                        progress._on_file_failed(m.weight, m.received)
+                        failures[m.info] = arg
+                Logger.error(f"Downloader: Failed to download {job.pack}, cause: {arg}")
+                return
+            progress._on_file_failed(job.weight, job.received)
+            failures[job.info] = arg
+            if job.pack:
+                job.pack.release()
+            Logger.error(f"Downloader: Failed to download {job.info.name}, cause: {arg}")
+
+        self._stages = [
+            ArkPipelineStage('fetch', fetch, self._max_workers, size_of=lambda x:x.data_size, expand=True),
+            ArkPipelineStage('inflate', inflate, self._inflate_workers, size_of=lambda x:x.size, expand=True),
+            ArkPipelineStage('verify', verify, 1, size_of=lambda x:x.size),
+            ArkPipelineStage('write', write, 1, size_of=lambda x:x.size)
+        ]
+        pipeline = ArkPipeline(self._stages, on_failed)
+        if infos:
+            self._client.clean_stale_parts(infos[0].local.root_dir)
+        with TestRT('download_batch'):
+            pool_cls = ProcessPoolExecutor if self._inflate_in_process else ThreadPoolExecutor
+            with pool_cls(self._inflate_workers) as inflater:
+                pipeline.run(iter_jobs(),
+                             (lambda:on_progress(progress)) if on_progress else None,
+                             ArkDownloader.REPORT_INTERVAL)
+        for i in self._stages:
+            Logger.info(f"Downloader: {i}")
+        if self._store:
+            self._store.save_index()
+            Logger.info(f"Downloader: Asset store {self._store.hits} hits, {self._store.misses} misses")
+        return failures
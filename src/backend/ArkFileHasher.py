@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, hashlib, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ..utils.AnalyUtils import TestRT
+
+
+class ArkFileHasher:
+    """Service that computes the MD5s of the files on a thread pool.
+
+    The files are read in fixed-size chunks, so a huge file will not be loaded into the memory at once.
+    Since `hashlib` releases the GIL while hashing a large chunk, the workers can hash in parallel.
+    The requests for the same file are deduplicated, and the results are memoised by the path,
+    the size and the modification time of the file.
+    """
+    CHUNK_SIZE = 1048576
+
+    def __init__(self, max_workers:int=None):
+        """Initializes an ArkFileHasher instance. The thread pool is created on the first request.
+
+        :param max_workers: The number of the hashing threads. If `None`, the default of the thread pool is used;
+        """
+        self._max_workers = max_workers
+        self._executor:ThreadPoolExecutor = None
+        self._lock = threading.Lock()
+        self._memo:"dict[str,tuple[int,int,str]]" = {}
+        self._pending:"dict[tuple[str,int,int],Future]" = {}
+
+    def submit(self, path:str, stat:"tuple[int,int]"=None):
+        """Requests the MD5 of the given file.
+
+        :param path: The path of the file;
+        :param stat: The size and the modification time in nanoseconds of the file. If `None`, they are read now;
+        :returns: The future of the MD5 hex digest;
+        :rtype: Future[str];
+        """
+        if stat is None:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            memo = self._memo.get(path, None)
+            if memo and memo[:2] == stat:
+                future = Future()
+                future.set_result(memo[2])
+                return future
+            key = (path, *stat)
+            future = self._pending.get(key, None)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix=self.__class__.__name__)
+                future = self._executor.submit(self._hash, path, stat)
+                self._pending[key] = future
+            return future
+
+    def get(self, path:str, stat:"tuple[int,int]"=None):
+        """Returns the MD5 of the given file, waiting for the hashing if needed.
+
+        :param path: The path of the file;
+        :param stat: The size and the modification time in nanoseconds of the file. If `None`, they are read now;
+        :returns: The MD5 hex digest;
+        :rtype: str;
+        """
+        return self.submit(path, stat).result()
+
+    def remember(self, path:str, stat:"tuple[int,int]", md5:str):
+        """Records the MD5 of the given file, which is known without hashing.
+
+        :param path: The path of the file;
+        :param stat: The size and the modification time in nanoseconds of the file;
+        :param md5: The MD5 hex digest;
+        """
+        with self._lock:
+            self._memo[path] = (*stat, md5)
+
+    def _hash(self, path:str, stat:"tuple[int,int]"):
+        try:
+            md5 = ArkFileHasher.hash_file(path)
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) == stat:
+                # The result is not memoised if the file has been modified while hashing
+                with self._lock:
+                    self._memo[path] = (*stat, md5)
+            return md5
+        finally:
+            with self._lock:
+                self._pending.pop((path, *stat), None)
+
+    @staticmethod
+    def hash_file(path:str):
+        """Computes the MD5 of the given file in the calling thread.
+
+        :param path: The path of the file;
+        :returns: The MD5 hex digest;
+        :rtype: str;
+        """
+        with TestRT('hash_file'):
+            digest = hashlib.md5()
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(ArkFileHasher.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+            return digest.hexdigest()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, sqlite3, threading
+
+from ..utils.Logger import Logger
+
+
+class ArkLocalIndex:
+    """Persistent index of a local repository, which records the size, the modification time and the MD5
+    of each file. A file whose size and modification time are unchanged since the last record
+    can trust the recorded MD5, so only the changed files need to be rehashed.
+
+    The index is an SQLite database stored in the root directory of the repository,
+    which is created on the first save that has any record to write.
+    Any error of the index is logged and ignored, since the digests can always be computed again.
+    """
+
+    FILE_NAME = '.ArkStudioIndex.db'
+    """Name of the index file. The files whose names start with it should be excluded from the repository."""
+    SCHEMA_VERSION = 1
+
+    def __init__(self, root_dir:str):
+        """Initializes an ArkLocalIndex instance.
+
+        :param root_dir: The root directory of the repository;
+        """
+        self._path = os.path.join(root_dir, ArkLocalIndex.FILE_NAME)
+        self._lock = threading.Lock()
+        self._records:"dict[str,tuple[int,int,str]]" = {} # The records as of the last load or save
+        self._file_id:"tuple[int,int]" = None # The identity of the index file as of the last load or save
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path)
+        if conn.execute('PRAGMA user_version').fetchone()[0] != ArkLocalIndex.SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS files')
+            conn.execute('CREATE TABLE files (name TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, md5 TEXT)')
+            conn.execute(f'PRAGMA user_version = {ArkLocalIndex.SCHEMA_VERSION}')
+            conn.commit()
+        return conn
+
+    def load(self):
+        """Loads the records from the index file.
+
+        :returns: The dict mapping the file names to their sizes, modification times in nanoseconds and MD5s;
+        :rtype: dict[str,tuple[int,int,str]];
+        """
+        with self._lock:
+            self._records = {}
+            self._file_id = None
+            if not os.path.isfile(self._path):
+                return {}
+            try:
+                conn = self._connect()
+                try:
+                    self._records = {n: (s, m, h) for n, s, m, h in
+                                     conn.execute('SELECT name, size, mtime, md5 FROM files')}
+                finally:
+                    conn.close()
+                self._file_id = self._get_file_id()
+            except sqlite3.Error as arg:
+                Logger.warn(f"LocalIndex: Failed to load index, cause: {arg}")
+                self._records = {}
+            return dict(self._records)
+
+    def _get_file_id(self):
+        try:
+            st = os.stat(self._path)
+            return (st.st_dev, st.st_ino)
+        except OSError:
+            return None
+
+    def save(self, records:"dict[str,tuple[int,int,str]]"):
+        """Saves the given records as the whole content of the index file.
+        Only the differences from the last loaded or saved records are written, unless the index file
+        has been removed or replaced since then, in which case all the records are written.
+
+        :param records: The dict mapping the file names to their sizes, modification times and MD5s;
+        """
+        with self._lock:
+            rewrite = self._file_id is None or self._get_file_id() != self._file_id
+            if rewrite:
+                changed = [(n, *r) for n, r in records.items()]
+                removed = []
+            else:
+                changed = [(n, *r) for n, r in records.items() if self._records.get(n, None) != r]
+                removed = [(n,) for n in self._records if n not in records]
+            if not changed and not removed:
+                return
+            try:
+                conn = self._connect()
+                try:
+                    with conn:
+                        if rewrite:
+                            conn.execute('DELETE FROM files')
+                        conn.executemany('DELETE FROM files WHERE name = ?', removed)
+                        conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', changed)
+                finally:
+                    conn.close()
+                self._records = dict(records)
+                self._file_id = self._get_file_id()
+                Logger.info(f"LocalIndex: Saved {len(changed)} changed and {len(removed)} removed records")
+            except sqlite3.Error as arg:
+                Logger.warn(f"LocalIndex: Failed to save index, cause: {arg}")
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, re, json, time, random, hashlib, tempfile, threading, zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..backend import ArkClientPayload as acp
+from ..utils.OSUtils import FileSystem
+
+
+class ArkMockAsset:
+    """Synthetic asset record of the mock server."""
+
+    def __init__(self, name:str, file_size:int, seed:int, pack:str=None):
+        self.name = name
+        self.file_size = file_size
+        self.seed = seed
+        self.pack = pack
+        self.data_name = acp.ArkRemoteFileInfo({'name': name, 'totalSize': 0, 'abSize': 0}).data_name
+        self.data_size = 0
+        self.md5 = ''
+
+    def to_dict(self):
+        rst = {
+            'name': self.name,
+            'hash': self.md5,
+            'md5': self.md5,
+            'totalSize': self.data_size,
+            'abSize': self.file_size,
+            'cid': 0
+        }
+        if self.pack:
+            rst['pid'] = self.pack
+        return rst
+
+
+class ArkMockPack:
+    """Synthetic pack record of the mock server."""
+
+    def __init__(self, name:str):
+        self.name = name
+        self.data_name = acp.ArkPackInfo({'name': name, 'totalSize': 0}).data_name
+        self.data_size = 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'totalSize': self.data_size,
+            'cid': 0
+        }
+
+
+class ArkMockServer:
+    """Local stand-in of the Arknights asset server, used to measure the sync performance offline.
+    It serves a synthetic network config, version, `hot_update_list.json`, zipped assets and pack archives
+    in the same layout as the official server. Usage is shown below.
+
+    ```
+    server = ArkMockServer([1048576] * 100, latency=0.05, bandwidth=1048576)
+    server.start()
+    client = ArkClient(config_source=server.config_source)
+    # Use the client here
+    server.stop()
+    ```
+    """
+    RES_VERSION = '24-01-01-00-00-00-000000'
+    CLIENT_VERSION = '2.1.01'
+    CHUNK_SIZE = 65536
+
+    def __init__(self,
+                 file_sizes:"list[int]",
+                 latency:float=0.0,
+                 bandwidth:int=0,
+                 error_rate:float=0.0,
+                 host:str='127.0.0.1',
+                 port:int=0,
+                 data_dir:str=None,
+                 seed:int=0,
+                 pack_size:int=0):
+        """Initializes an ArkMockServer instance. The synthetic assets are generated immediately.
+
+        :param file_sizes: The unzipped sizes of the synthetic assets, one for each;
+        :param latency: The delay in seconds before each response;
+        :param bandwidth: The speed cap in bytes per second for each connection, `0` for unlimited;
+        :param error_rate: The probability in [0.0, 1.0] that an asset response fails,
+                           either by an error status or by a connection dropped halfway;
+        :param host: The host to bind;
+        :param port: The port to bind, `0` for an arbitrary free port;
+        :param data_dir: The directory to store the zipped assets. If `None`, a temporary directory is used;
+        :param seed: The random seed of the synthetic data and the error injection;
+        :param pack_size: The number of the assets in each pack, `0` for no packs;
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._data_dir = data_dir if data_dir else tempfile.mkdtemp(prefix='ArkMockServer')
+        self._assets = [ArkMockAsset(f'mock/{i // 100:03}/asset_{i:06}.ab', s, seed + i,
+                                     f'lpack_mock_{i // pack_size:04}' if pack_size > 0 else None)
+                        for i, s in enumerate(file_sizes)]
+        self._packs = [ArkMockPack(n) for n in sorted(set(i.pack for i in self._assets if i.pack))]
+        self._name2data:"dict[str,ArkMockAsset|ArkMockPack]" = \
+            {i.data_name: i for i in [*self._assets, *self._packs]}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread:threading.Thread = None
+        self._generate()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config_source(self):
+        """The URL of the network config, which should be given to the client."""
+        return f"{self.base_url}/config/prod/official/network_config"
+
+    @property
+    def assets(self):
+        return self._assets
+
+    @property
+    def packs(self):
+        return self._packs
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                        name=self.__class__.__name__)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving and removes the generated data."""
+        self._server.shutdown()
+        self._server.server_close()
+        FileSystem.rm(self._data_dir)
+
+    def _generate(self):
+        FileSystem.mkdir(self._data_dir)
+        name2pack = {p.name: p for p in self._packs}
+        for a in self._assets:
+            rnd = random.Random(a.seed)
+            # Half random and half repeated, so that the data is compressible like the real assets
+            half = a.file_size // 2
+            data = rnd.getrandbits(half * 8).to_bytes(half, 'little') if half else b''
+            data += bytes(a.file_size - half)
+            path = os.path.join(self._data_dir, a.data_name)
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr(a.name, data)
+            a.md5 = hashlib.md5(data).hexdigest()
+            a.data_size = os.path.getsize(path)
+            if a.pack:
+                # The pack archive contains the inflated assets as its members
+                with zipfile.ZipFile(os.path.join(self._data_dir, name2pack[a.pack].data_name), 'a',
+                                     zipfile.ZIP_DEFLATED) as zf:
+                    zf.writestr(a.name, data)
+        for p in self._packs:
+            p.data_size = os.path.getsize(os.path.join(self._data_dir, p.data_name))
+
+    def _get_failure(self):
+        # Returns `None` for no failure, `True` for dropping the connection halfway or `False` for an error status
+        if self.error_rate <= 0:
+            return None
+        with self._random_lock:
+            if self._random.random() < self.error_rate:
+                return self._random.random() < 0.5
+            return None
+
+    def _get_json(self, path:str):
+        hu = f"{self.base_url}/assetbundle/official"
+        if path == '/config/prod/official/network_config':
+            content = {'configVer': '1', 'funcVer': 'V1', 'configs': {'V1': {'override': True, 'network': {
+                'hu': hu, 'hv': f"{hu}/{{0}}/version"}}}}
+            return {'sign': '', 'content': json.dumps(content)}
+        if re.fullmatch(r'/assetbundle/official/[^/]+/version', path):
+            return {'resVersion': ArkMockServer.RES_VERSION, 'clientVersion': ArkMockServer.CLIENT_VERSION}
+        if re.fullmatch(rf'/assetbundle/official/[^/]+/assets/{re.escape(ArkMockServer.RES_VERSION)}/'
+                        r'hot_update_list\.json', path):
+            return {'versionId': ArkMockServer.RES_VERSION,
+                    'abInfos': [i.to_dict() for i in self._assets],
+                    'packInfos': [i.to_dict() for i in self._packs]}
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                path = self.path.split('?')[0]
+                obj = server._get_json(path)
+                if obj is not None:
+                    body = json.dumps(obj).encode()
+                    etag = f'"{hashlib.md5(body).hexdigest()}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                m = re.fullmatch(rf'/assetbundle/official/[^/]+/assets/{re.escape(ArkMockServer.RES_VERSION)}/([^/]+)',
+                                 path)
+                asset = server._name2data.get(m.group(1)) if m else None
+                if asset is None:
+                    self.send_error(404)
+                    return
+                failure = server._get_failure()
+                if failure is not None:
+                    # Either reject the request or drop the connection halfway, like a flaky network
+                    if failure:
+                        self._send_asset(asset, truncate=True)
+                    else:
+                        self.send_error(500)
+                    return
+                self._send_asset(asset)
+
+            def _send_asset(self, asset:"ArkMockAsset|ArkMockPack", truncate:bool=False):
+                start, end = 0, asset.data_size
+                m = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if m:
+                    start = int(m.group(1))
+                    if start >= end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{end}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end - 1}/{end}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start))
+                self.end_headers()
+                with open(os.path.join(server._data_dir, asset.data_name), 'rb') as f:
+                    f.seek(start)
+                    t = time.monotonic()
+                    sent = 0
+                    limit = (end - start) // 2 if truncate else end - start
+                    while sent < limit:
+                        chunk = f.read(min(ArkMockServer.CHUNK_SIZE, limit - sent))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if server.bandwidth > 0:
+                            delay = sent / server.bandwidth - (time.monotonic() - t)
+                            if delay > 0:
+                                time.sleep(delay)
+                if truncate:
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import threading, time
+from queue import Queue
+from typing import Any, Callable, Iterable
+
+from ..utils.Logger import Logger
+
+
+class ArkPipelineStage:
+    """Stage of a pipeline, which handles the items from its bounded input queue with its own worker threads.
+    The stage records its counters, so that the bottleneck of the pipeline can be told.
+    """
+
+    def __init__(self,
+                 name:str,
+                 handler:"Callable[[Any],Any]",
+                 workers:int=1,
+                 queue_size:int=None,
+                 size_of:"Callable[[Any],int]"=None,
+                 expand:bool=False):
+        """Initializes an ArkPipelineStage instance.
+
+        :param name: The name of the stage;
+        :param handler: The function that handles an item and returns the item to pass to the next stage;
+        :param workers: The number of the worker threads;
+        :param queue_size: The capacity of the input queue. If `None`, twice the number of the workers is used;
+        :param size_of: The function that returns the byte size of a handled item, used for the throughput;
+        :param expand: Whether the handler returns an iterable of the items to pass to the next stage,
+                       so that an item can be split into several ones or dropped;
+        """
+        self._name = name
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._queue = Queue(queue_size if queue_size else self._workers * 2)
+        self._size_of = size_of
+        self._expand = expand
+        self._lock = threading.Lock()
+        self._alive = 0
+        self._processed = 0
+        self._failed = 0
+        self._bytes = 0
+        self._busy_time = 0.0
+        self._start_time = None
+        self._end_time = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def processed(self):
+        """Number of the items handled successfully."""
+        return self._processed
+
+    @property
+    def failed(self):
+        """Number of the items failed to handle."""
+        return self._failed
+
+    @property
+    def queue_depth(self):
+        """Number of the items waiting in the input queue."""
+        return self._queue.qsize()
+
+    @property
+    def throughput(self):
+        """Handled bytes per second since the stage started."""
+        elapsed = self._get_elapsed()
+        return self._bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def utilization(self):
+        """Ratio of the busy time to the available time of the workers, in [0.0, 1.0]."""
+        elapsed = self._get_elapsed()
+        return min(1.0, self._busy_time / (elapsed * self._workers)) if elapsed > 0 else 0.0
+
+    def _get_elapsed(self):
+        if self._start_time is None:
+            return 0.0
+        return (self._end_time if self._end_time else time.time()) - self._start_time
+
+    def __repr__(self):
+        return f"Stage({self._name}, {self._processed} done, {self._failed} failed, " \
+               f"{self.queue_depth} queued, {self.throughput / 1048576:.2f} MB/s, {self.utilization:.0%} busy)"
+
+
+class ArkPipeline:
+    """Pipeline that passes the items through the stages, where all the stages run at the same time.
+    Once an item fails in a stage, it is reported and not passed to the subsequent stages.
+    """
+
+    _END = object()
+
+    def __init__(self,
+                 stages:"list[ArkPipelineStage]",
+                 on_failed:"Callable[[Any,BaseException],None]"=None):
+        """Initializes an ArkPipeline instance.
+
+        :param stages: The stages in order;
+        :param on_failed: The callback that will be called with the item and the exception when an item fails;
+        """
+        if not stages:
+            raise ValueError("Argument stages is empty")
+        self._stages = stages
+        self._on_failed = on_failed
+        self._threads:"list[threading.Thread]" = []
+        self._feed_error:Exception = None
+
+    @property
+    def stages(self):
+        return self._stages
+
+    def get_bottleneck(self):
+        """Returns the stage that has the highest utilization."""
+        return max(self._stages, key=lambda x:x.utilization)
+
+    def run(self, items:"Iterable[Any]", on_tick:"Callable[[],None]"=None, tick_interval:float=0.5):
+        """Passes the given items through the pipeline and waits until all of them are handled.
+
+        :param items: The items to feed to the first stage;
+        :param on_tick: The callback that will be called in the calling thread periodically;
+        :param tick_interval: The interval of the ticks in seconds;
+        :raises Exception: If the given items fail to be iterated, after the fed items are handled;
+        """
+        self._feed_error = None
+        for i, stage in enumerate(self._stages):
+            stage._alive = stage.workers
+            stage._start_time = time.time()
+            stage._end_time = None
+            for j in range(stage.workers):
+                t = threading.Thread(target=self._work, args=(i,), daemon=True,
+                                     name=f"{self.__class__.__name__}:{stage.name}-{j}")
+                t.start()
+                self._threads.append(t)
+        feeder = threading.Thread(target=self._feed, args=(items,), daemon=True,
+                                  name=f"{self.__class__.__name__}:feeder")
+        feeder.start()
+        for t in self._threads:
+            while t.is_alive():
+                t.join(tick_interval)
+                if on_tick:
+                    on_tick()
+        self._threads.clear()
+        if on_tick:
+            on_tick()
+        if self._feed_error:
+            raise self._feed_error
+
+    def _feed(self, items:"Iterable[Any]"):
+        first = self._stages[0]
+        try:
+            for i in items:
+                first._queue.put(i)
+        except Exception as arg:
+            Logger.error(f"Pipeline: Failed to feed the items, cause: {arg}")
+            self._feed_error = arg
+        finally:
+            # The stages are always ended, otherwise the run will never return
+            for _ in range(first.workers):
+                first._queue.put(ArkPipeline._END)
+
+    def _work(self, index:int):
+        stage = self._stages[index]
+        next_stage = self._stages[index + 1] if index + 1 < len(self._stages) else None
+        try:
+            while True:
+                item = stage._queue.get()
+                if item is ArkPipeline._END:
+                    return
+                self._handle(stage, next_stage, item)
+        finally:
+            # The bookkeeping is also done if the worker exits abnormally, so the next stage can always be ended
+            with stage._lock:
+                stage._alive -= 1
+                last = stage._alive == 0
+            if last:
+                # All the items of this stage have been passed, so the next stage can be ended
+                stage._end_time = time.time()
+                if next_stage:
+                    for _ in range(next_stage.workers):
+                        next_stage._queue.put(ArkPipeline._END)
+
+    def _handle(self, stage:ArkPipelineStage, next_stage:"ArkPipelineStage|None", item:Any):
+        t = time.time()
+        try:
+            rst = stage._handler(item)
+            rsts = list(rst) if stage._expand else (rst,)
+            size = sum(stage._size_of(i) for i in rsts) if stage._size_of else 0
+        except Exception as arg:
+            with stage._lock:
+                stage._failed += 1
+                stage._busy_time += time.time() - t
+            if self._on_failed:
+                try:
+                    self._on_failed(item, arg)
+                except Exception as arg2:
+                    Logger.error(f"Pipeline: Failed to report the failure in stage {stage.name}, cause: {arg2}")
+            return
+        with stage._lock:
+            stage._processed += 1
+            stage._busy_time += time.time() - t
+            stage._bytes += size
+        if next_stage:
+            for i in rsts:
+                next_stage._queue.put(i)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import os, sys, time, errno, select, struct, threading
+import ctypes, ctypes.util
+from typing import Callable
+
+from ..backend import ArkClientPayload as acp
+from ..utils.Logger import Logger
+
+
+class ArkRepoWatcher:
+    """Watcher of the files in the directory of a local repository.
+
+    On Linux, the changes are notified by inotify. Otherwise, or if inotify is unavailable,
+    the directory can be scanned periodically and compared with the last scan. Since each scan walks
+    the whole directory, the polling is only used if it is allowed explicitly.
+    The changed names are coalesced in small batches, then passed to the callback in the watcher thread.
+    A name in the batch may be a file name or a directory name, and an empty name stands for the whole directory,
+    which are all accepted by `update_files` of the repositories.
+    """
+    BATCH_DELAY = 0.2
+    """Seconds to wait for more changes after the first change of a batch."""
+    POLL_INTERVAL = 5.0
+    """Seconds between two scans in the polling mode."""
+
+    def __init__(self, root_dir:str, on_changed:"Callable[[set[str]],None]", use_inotify:bool=True,
+                 allow_polling:bool=False):
+        """Initializes an ArkRepoWatcher instance. The watching begins after `start` is called.
+
+        :param root_dir: The root directory of the repository;
+        :param on_changed: The callback accepting the set of the changed names;
+        :param use_inotify: Whether to use inotify if available;
+        :param allow_polling: Whether to poll the directory if inotify is not used, otherwise nothing is watched;
+        """
+        self._root_dir = root_dir
+        self._on_changed = on_changed
+        self._use_inotify = use_inotify and _Inotify.is_available()
+        self._allow_polling = allow_polling
+        self._stopped = threading.Event()
+        self._thread:threading.Thread = None
+
+    @property
+    def root_dir(self):
+        return self._root_dir
+
+    @property
+    def native(self):
+        """`True` if the changes are notified by the system, `False` if the directory is polled."""
+        return self._use_inotify
+
+    def start(self):
+        """Starts watching in a daemon thread."""
+        if self._thread:
+            raise RuntimeError("This watcher has started")
+        if not self._use_inotify and not self._allow_polling:
+            Logger.info("RepoWatcher: Native watching is unavailable and polling is disabled, nothing is watched")
+            return
+        target = self._run_inotify if self._use_inotify else self._run_polling
+        self._thread = threading.Thread(target=target, daemon=True, name=self.__class__.__name__)
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching. The callback will not be called after the watcher thread exits."""
+        self._stopped.set()
+
+    def _emit(self, names:"set[str]"):
+        if names and not self._stopped.is_set():
+            try:
+                self._on_changed(names)
+            except Exception as arg:
+                Logger.error(f"RepoWatcher: Failed to apply {len(names)} changes, cause: {arg}")
+
+    def _run_inotify(self):
+        try:
+            inotify = _Inotify(self._root_dir)
+        except OSError as arg:
+            self._use_inotify = False
+            if self._allow_polling:
+                Logger.warn(f"RepoWatcher: Failed to use inotify, fallback to polling, cause: {arg}")
+                self._run_polling()
+            else:
+                Logger.warn(f"RepoWatcher: Failed to use inotify, cause: {arg}")
+            return
+        Logger.info(f"RepoWatcher: Watching {inotify.watch_count} directories by inotify")
+        try:
+            pending:"set[str]" = set()
+            deadline = None
+            while not self._stopped.is_set():
+                timeout = 0.5 if deadline is None else max(0.0, deadline - time.monotonic())
+                names = inotify.read(timeout)
+                if names:
+                    pending.update(names)
+                    if deadline is None:
+                        deadline = time.monotonic() + ArkRepoWatcher.BATCH_DELAY
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._emit(pending)
+                    pending = set()
+                    deadline = None
+        finally:
+            inotify.close()
+
+    def _run_polling(self):
+        Logger.info(f"RepoWatcher: Watching by polling every {ArkRepoWatcher.POLL_INTERVAL}s")
+        last = self._snapshot()
+        while not self._stopped.wait(ArkRepoWatcher.POLL_INTERVAL):
+            cur = self._snapshot()
+            if cur is None or last is None:
+                changed = {''} if cur is not last else set()
+            else:
+                changed = {n for n, s in cur.items() if last.get(n, None) != s}
+                changed.update(n for n in last if n not in cur)
+            last = cur
+            self._emit(changed)
+
+    def _snapshot(self):
+        try:
+            repo = acp.ArkLocalAssetsRepo(self._root_dir, use_index=False)
+        except OSError:
+            return None
+        return {i.name: i.stat for i in repo.infos}
+
+
+class _Inotify:
+    """Minimal wrapper of the Linux inotify API, which watches a directory tree recursively."""
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    # The modifications are reported when the file is closed, so a file being written is not read halfway
+    WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+    EVENT_HEADER = struct.Struct('iIII')
+    _libc = None
+
+    def __init__(self, root_dir:str):
+        libc = _Inotify._load()
+        self._root_dir = root_dir
+        self._fd = libc.inotify_init1(_Inotify.IN_NONBLOCK | _Inotify.IN_CLOEXEC)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self._wd2name:"dict[int,str]" = {}
+        try:
+            self._watch_tree('')
+        except OSError:
+            self.close()
+            raise
+
+    @property
+    def watch_count(self):
+        return len(self._wd2name)
+
+    def read(self, timeout:float):
+        """Waits for the events and returns the changed names.
+
+        :param timeout: The maximum seconds to wait;
+        :returns: The changed names;
+        :rtype: set[str];
+        """
+        names:"set[str]" = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return names
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, size = _Inotify.EVENT_HEADER.unpack_from(data, offset)
+            offset += _Inotify.EVENT_HEADER.size
+            base = data[offset:offset + size].rstrip(b'\0').decode(sys.getfilesystemencoding(), 'surrogateescape')
+            offset += size
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                names.add('') # Some events are lost, so the whole directory is checked
+                continue
+            if mask & _Inotify.IN_IGNORED:
+                self._wd2name.pop(wd, None)
+                continue
+            parent = self._wd2name.get(wd, None)
+            if parent is None or not base:
+                continue
+            name = f'{parent}{acp.FileInfoBase.SEP}{base}' if parent else base
+            if mask & _Inotify.IN_ISDIR:
+                if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                    try:
+                        self._watch_tree(name)
+                    except OSError as arg:
+                        Logger.warn(f"RepoWatcher: Failed to watch directory {name}, cause: {arg}")
+                elif mask & _Inotify.IN_MOVED_FROM:
+                    self._unwatch_tree(name)
+                names.add(name)
+            elif not (mask & _Inotify.IN_CREATE) and not acp.ArkLocalAssetsRepo.is_excluded(name):
+                # The creation of a file is followed by its closing, which is reported instead
+                names.add(name)
+        return names
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch_tree(self, name:str):
+        top = os.path.join(self._root_dir, name) if name else self._root_dir
+        for path, dirs, _ in os.walk(top):
+            rel = os.path.relpath(path, self._root_dir)
+            rel = '' if rel == os.curdir else rel.replace(os.sep, acp.FileInfoBase.SEP)
+            wd = _Inotify._libc.inotify_add_watch(self._fd, os.fsencode(path), _Inotify.WATCH_MASK)
+            if wd < 0:
+                e = ctypes.get_errno()
+                if e in (errno.ENOENT, errno.ENOTDIR):
+                    dirs.clear() # The directory has been removed just now
+                    continue
+                raise OSError(e, os.strerror(e), path)
+            self._wd2name[wd] = rel
+
+    def _unwatch_tree(self, name:str):
+        # The watches of a directory moved out still work, so they must be removed to avoid the wrong names
+        prefix = name + acp.FileInfoBase.SEP
+        for wd in [wd for wd, n in self._wd2name.items() if n == name or n.startswith(prefix)]:
+            _Inotify._libc.inotify_rm_watch(self._fd, wd)
+            del self._wd2name[wd]
+
+    @staticmethod
+    def is_available():
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            _Inotify._load()
+            return True
+        except (OSError, AttributeError):
+            return False
+
+    @staticmethod
+    def _load():
+        if _Inotify._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            _Inotify._libc = libc
+        return _Inotify._libc
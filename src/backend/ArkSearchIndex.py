@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+import re, fnmatch, threading
+from array import array
+from typing import Callable, Iterable, Iterator
+
+from ..backend import ArkClientPayload as acp
+from ..utils.AnalyUtils import TestRT
+
+
+class ArkSearchIndex:
+    """Trigram index of the file names, which finds the files by substrings, glob patterns or regular expressions.
+
+    Each file name is split into its 3-character substrings, and each substring maps to the ids of the files
+    containing it. A query narrows the candidates down by the substrings that must appear in the matched names,
+    then verifies each candidate. The names are matched case-insensitively.
+    """
+    MODE_SUBSTRING = 0
+    MODE_GLOB = 1
+    MODE_REGEX = 2
+    _GRAM = 3
+    _MAX_POSTINGS = 4 # The maximum number of the posting lists to intersect, the rest are left to the verification
+
+    def __init__(self, infos:"Iterable[acp.FileInfoBase]"=()):
+        """Initializes an ArkSearchIndex instance.
+
+        :param infos: The files to index;
+        """
+        self._lock = threading.Lock()
+        self._infos:"list[acp.FileInfoBase|None]" = [] # Indexed by the ids, `None` for the removed ones
+        self._names:"list[str|None]" = []
+        self._name2id:"dict[str,int]" = {}
+        self._postings:"dict[str,array]" = {}
+        self._removed = 0
+        with TestRT('search_index_build'):
+            for i in infos:
+                self._add(i)
+
+    def __len__(self):
+        return len(self._name2id)
+
+    def add(self, info:acp.FileInfoBase):
+        """Adds the given file, replacing the file of the same name if any.
+
+        :param info: The file;
+        """
+        with self._lock:
+            self._add(info)
+
+    def remove(self, info:acp.FileInfoBase):
+        """Removes the file of the same name as the given file if any.
+
+        :param info: The file;
+        """
+        with self._lock:
+            self._remove(info.name)
+            self._compact()
+
+    def sync(self, infos:"Iterable[acp.FileInfoBase]"):
+        """Makes the index contain exactly the given files. Only the added and the removed names are re-indexed,
+        so it is much faster than building a new index when most of the names are unchanged.
+
+        :param infos: The files;
+        """
+        with self._lock, TestRT('search_index_sync'):
+            names = set()
+            for i in infos:
+                names.add(i.name)
+                self._add(i)
+            for n in [n for n in self._name2id if n not in names]:
+                self._remove(n)
+            self._compact()
+
+    def search(self, query:str, mode:int=MODE_SUBSTRING) -> "Iterator[acp.FileInfoBase]":
+        """Yields the files whose names match the given query, in the order of being indexed.
+
+        In the glob mode, the pattern is matched against the whole name if it contains a separator,
+        otherwise against the base name. In the regex mode, the pattern is searched in the whole name.
+
+        :param query: The query string;
+        :param mode: The matching mode, one of the `MODE_*` constants;
+        :returns: The iterator of the matched files;
+        :raises re.error: If the regular expression is invalid;
+        """
+        if mode == ArkSearchIndex.MODE_SUBSTRING:
+            query = query.lower()
+            literals = [query]
+            match = lambda x:query in x
+        elif mode == ArkSearchIndex.MODE_GLOB:
+            query = query.lower()
+            literals = ArkSearchIndex._get_glob_literals(query)
+            pattern = re.compile(fnmatch.translate(query))
+            if acp.FileInfoBase.SEP in query:
+                match = lambda x:pattern.match(x) is not None
+            else:
+                match = lambda x:pattern.match(x.rpartition(acp.FileInfoBase.SEP)[2]) is not None
+        elif mode == ArkSearchIndex.MODE_REGEX:
+            # The required literals of an arbitrary expression are not extracted, so all the names are verified
+            literals = []
+            pattern = re.compile(query, re.IGNORECASE)
+            match = lambda x:pattern.search(x) is not None
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+        with self._lock:
+            return ArkSearchIndex._iter_matched(self._get_candidates(literals), self._names, self._infos, match)
+
+    @staticmethod
+    def _iter_matched(candidates:"Iterable[int]", names:"list[str|None]", infos:"list[acp.FileInfoBase|None]",
+                      match:"Callable[[str],bool]"):
+        for i in candidates:
+            name = names[i]
+            if name is not None and match(name):
+                info = infos[i]
+                if info is not None:
+                    yield info
+
+    def _get_candidates(self, literals:"list[str]"):
+        postings:"list[array]" = []
+        for l in literals:
+            for g in ArkSearchIndex._get_grams(l):
+                p = self._postings.get(g, None)
+                if p is None:
+                    return []
+                postings.append(p)
+        if not postings:
+            return range(len(self._names))
+        postings.sort(key=len)
+        rst = set(postings[0])
+        for p in postings[1:ArkSearchIndex._MAX_POSTINGS]:
+            rst.intersection_update(p)
+        return sorted(rst)
+
+    def _add(self, info:acp.FileInfoBase):
+        i = self._name2id.get(info.name, None)
+        if i is not None:
+            self._infos[i] = info
+            return
+        i = len(self._names)
+        name = info.name.lower()
+        self._infos.append(info)
+        self._names.append(name)
+        self._name2id[info.name] = i
+        for g in ArkSearchIndex._get_grams(name):
+            p = self._postings.get(g, None)
+            if p is None:
+                p = self._postings[g] = array('I')
+            p.append(i)
+
+    def _remove(self, name:str):
+        # The posting lists are left untouched, and the removed ids are skipped in the verification
+        i = self._name2id.pop(name, None)
+        if i is not None:
+            self._infos[i] = None
+            self._names[i] = None
+            self._removed += 1
+
+    def _compact(self):
+        # Rebuilds the index once the removed ids make up the most of it
+        if self._removed > len(self._name2id):
+            infos = [i for i in self._infos if i is not None]
+            self._infos, self._names, self._name2id, self._postings, self._removed = [], [], {}, {}, 0
+            for i in infos:
+                self._add(i)
+
+    @staticmethod
+    def _get_grams(text:str):
+        return {text[i:i + ArkSearchIndex._GRAM] for i in range(len(text) - ArkSearchIndex._GRAM + 1)}
+
+    @staticmethod
+    def _get_glob_literals(pattern:str):
+        # Returns the literal runs of the given glob pattern, which must appear in the matched names
+        literals:"list[str]" = []
+        run = ''
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c in '*?[':
+                literals.append(run)
+                run = ''
+                if c == '[':
+                    # Skips the character set, whose leading ']' is a literal member
+                    j = pattern.find(']', i + 2)
+                    if j < 0:
+                        run = pattern[i:]
+                        break
+                    i = j
+            else:
+                run += c
+            i += 1
+        literals.append(run)
+        return [l for l in literals if len(l) >= ArkSearchIndex._GRAM]
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022-2024, Harry Huang
+# @ BSD 3-Clause License
+from typing import Callable, Iterable
+
+from ..backend import ArkClient as ac
+from ..backend import ArkClientPayload as acp
+from ..backend.ArkAssetStore import ArkAssetStore
+from ..backend.ArkDownloader import ArkDownloader, ArkDownloadProgress
+from ..utils.AnalyUtils import TestRT
+from ..utils.Config import Config
+from ..utils.Logger import Logger
+
+
+class ArkSyncPlan:
+    """Plan of a sync, which lists the files to delete and to download, and estimates the cost of the sync.
+    It is made without touching the network, and it can be executed by a downloader later.
+    """
+    MIN_MEASURED_BYTES = 1048576
+    """Minimum received bytes of a sync for its average speed to be recorded as the measured throughput."""
+
+    def __init__(self,
+                 deletes:"list[acp.ArkIntegratedFileInfo]",
+                 downloads:"list[acp.ArkIntegratedFileInfo]",
+                 packs:"dict[acp.ArkPackInfo,list[acp.ArkIntegratedFileInfo]]",
+                 restorable:"list[acp.ArkIntegratedFileInfo]",
+                 checked:"list[acp.ArkIntegratedFileInfo]"=None):
+        """Initializes an ArkSyncPlan instance. Please use `ArkSyncPlanner.plan` to make a plan.
+
+        :param deletes: The files to delete;
+        :param downloads: The files to download;
+        :param packs: The packs to fetch as a whole and their members to download;
+        :param restorable: The files to download that can be restored from the asset store;
+        :param checked: The files whose statuses were computed for the plan, `None` for the changed files only;
+        """
+        self._checked = deletes + downloads if checked is None else checked
+        self._deletes = deletes
+        self._downloads = downloads
+        self._packs = packs
+        packed = {i for l in packs.values() for i in l}
+        restorable_set = set(restorable)
+        self._restorable_count = len(restorable)
+        self._data_size = sum(i.remote.data_size for i in downloads)
+        self._file_size = sum(i.remote.file_size for i in downloads)
+        # A pack is not fetched if all its members can be restored
+        self._fetch_size = sum(p.data_size for p, l in packs.items() if not restorable_set.issuperset(l)) + \
+            sum(i.remote.data_size for i in downloads if i not in packed and i not in restorable_set)
+
+    @property
+    def deletes(self):
+        """The files to delete."""
+        return self._deletes
+
+    @property
+    def downloads(self):
+        """The files to download."""
+        return self._downloads
+
+    @property
+    def packs(self):
+        """The packs to fetch as a whole, mapping to their members to download."""
+        return self._packs
+
+    @property
+    def checked(self):
+        """The files whose statuses were computed for this plan, including the unchanged ones."""
+        return self._checked
+
+    @property
+    def restorable_count(self):
+        """Number of the files to download that can be restored from the asset store."""
+        return self._restorable_count
+
+    @property
+    def data_size(self):
+        """Sum of the data sizes of the files to download."""
+        return self._data_size
+
+    @property
+    def file_size(self):
+        """Sum of the file sizes of the files to download, which is the size to write to the disk."""
+        return self._file_size
+
+    @property
+    def fetch_size(self):
+        """Estimated bytes to receive through the network, taking the packs and the asset store into account."""
+        return self._fetch_size
+
+    @property
+    def estimated_time(self):
+        """Estimated seconds to receive the data, `None` if no throughput has been measured yet.
+        The throughput is measured on the last sync, and it is capped by the current speed limit.
+        """
+        speed = Config.get('download_throughput')
+        limit = ac.ArkClient.RATE_LIMITER.rate
+        if limit > 0:
+            speed = min(speed, limit) if speed > 0 else limit
+        if speed <= 0:
+            return None if self._fetch_size else 0.0
+        return self._fetch_size / speed
+
+    def is_empty(self):
+        return not self._deletes and not self._downloads
+
+    def execute(self,
+                downloader:ArkDownloader,
+                on_progress:"Callable[[ArkDownloadProgress],None]"=None,
+                is_cancelled:"Callable[[],bool]"=None):
+        """Deletes and downloads the files of this plan. The average speed is recorded as the measured throughput.
+        A file failed to delete or download will not abort the others.
+
+        :param downloader: The downloader to download with;
+        :param on_progress: The callback that accepts the download progress, see `ArkDownloader.download`;
+        :param is_cancelled: The callback that returns `True` if the pending files should be skipped;
+        :returns: The failed files and their exceptions;
+        :rtype: dict[ArkIntegratedFileInfo,BaseException];
+        """
+        failures:"dict[acp.ArkIntegratedFileInfo,BaseException]" = {}
+        for i in self._deletes:
+            if is_cancelled and is_cancelled():
+                return failures
+            try:
+                i.local.delete()
+            except OSError as arg:
+                failures[i] = arg
+                Logger.error(f"SyncPlan: Failed to delete {i.name}, cause: {arg}")
+        last:"list[ArkDownloadProgress]" = []
+        def on_progress_wrapper(p:ArkDownloadProgress):
+            last[:] = [p]
+            if on_progress:
+                on_progress(p)
+        failures.update(downloader.download(self._downloads, on_progress_wrapper, is_cancelled, list(self._packs)))
+        if last and last[0].received_bytes >= ArkSyncPlan.MIN_MEASURED_BYTES:
+            Config.set('download_throughput', int(last[0].speed))
+        return failures
+
+    def __repr__(self):
+        return f"SyncPlan[{len(self._deletes)} deletes, {len(self._downloads)} downloads]"
+
+
+class ArkSyncPlanner:
+    """Planner of the syncs of an integrated repository, which selects the changed files by the filters."""
+
+    NEED_DELETE = (acp.FileStatus.DELETE,)
+    NEED_DOWNLOAD = (acp.FileStatus.ADD, acp.FileStatus.MODIFY)
+
+    def __init__(self, repo:acp.ArkIntegratedAssetRepo, store:ArkAssetStore=None, use_packs:bool=True):
+        """Initializes an ArkSyncPlanner instance.
+
+        :param repo: The integrated repository;
+        :param store: The asset store to look up, `None` for not using a store;
+        :param use_packs: Whether the packs will be fetched as a whole when most of their members are needed;
+        """
+        self._repo = repo
+        self._store = store
+        self._use_packs = use_packs
+
+    def plan(self,
+             subtree:str=None,
+             types:"Iterable[str]"=None,
+             pids:"Iterable[str]"=None,
+             on_hashed:"Callable[[int,int],None]"=None):
+        """Makes a plan of the changed files that match all the given filters.
+        Only the statuses of the matched files are computed, and the network is never touched.
+        Since a file to delete has no remote record, it is excluded once a type or pack filter is given.
+
+        :param subtree: The directory to sync, `None` for the whole repository;
+        :param types: The remote types to sync, `None` for all the types;
+        :param pids: The pack ids to sync, `None` for all the packs;
+        :param on_hashed: The callback that accepts the numbers of the hashed files and the files to hash;
+        :returns: The plan;
+        :rtype: ArkSyncPlan;
+        """
+        with TestRT('sync_plan'):
+            infos = list(self._repo.infos) # A snapshot, since the repository may be changed during the planning
+            if subtree:
+                prefix = subtree.rstrip(acp.FileInfoBase.SEP) + acp.FileInfoBase.SEP
+                infos = [i for i in infos if i.name.startswith(prefix)]
+            if types is not None:
+                types = set(types)
+                infos = [i for i in infos if i.remote and i.remote.type in types]
+            if pids is not None:
+                pids = set(pids)
+                infos = [i for i in infos if i.remote and i.remote.pack in pids]
+            deletes:"list[acp.ArkIntegratedFileInfo]" = []
+            downloads:"list[acp.ArkIntegratedFileInfo]" = []
+            for info, status in zip(infos, self._repo.get_statuses(infos, on_hashed=on_hashed)):
+                if status in ArkSyncPlanner.NEED_DELETE:
+                    deletes.append(info)
+                elif status in ArkSyncPlanner.NEED_DOWNLOAD:
+                    downloads.append(info)
+            packs = ArkDownloader.choose_packs(downloads, self._repo.remote.packs) if self._use_packs else {}
+            restorable = [i for i in downloads if self._store.contains(i.remote.md5)] if self._store else []
+            plan = ArkSyncPlan(deletes, downloads, packs, restorable, infos)
+        Logger.info(f"SyncPlanner: Planned {len(deletes)} deletes and {len(downloads)} downloads, "
+                    f"{plan.fetch_size} bytes to fetch")
+        return plan
@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2022-2024, Harry Huang
 # @ BSD 3-Clause License
-import os
+import os, re, threading
 import tkinter.filedialog as fd
 import customtkinter as ctk
 
 from src.backend import ArkClient as ac
 from src.backend import ArkClientPayload as acp
+from src.backend import ArkDownloader as ad
+from src.backend.ArkAssetStore import ArkAssetStore
+from src.backend.ArkDirRollup import ArkDirRollup
+from src.backend.ArkRepoWatcher import ArkRepoWatcher
+from src.backend.ArkSearchIndex import ArkSearchIndex
+from src.backend.ArkSyncPlanner import ArkSyncPlan, ArkSyncPlanner
 from src.utils import UIComponents as uic
-from src.utils.AnalyUtils import TestRT
+from src.utils.AnalyUtils import DurationFormatter, TestRT
 from src.utils.Config import Config
 from src.utils.OSUtils import FileSystem
 from src.utils.UIStyles import file_icon, icon, style
@@ -17,6 +23,8 @@ from .ArkStudioAppInterface import App
 
 
 class ResourceManagerPage(ctk.CTkFrame, uic.HidableGridWidget):
+    SAVE_INDEX_DELAY = 5000
+
     def __init__(self, app:App, grid_row:int, grid_column:int):
         ctk.CTkFrame.__init__(self, app, corner_radius=0)
         uic.HidableGridWidget.__init__(self, grid_row, grid_column, init_visible=False, sticky='nsew')
@@ -34,14 +42,19 @@ class ResourceManagerPage(ctk.CTkFrame, uic.HidableGridWidget):
         self.operation.grid(row=2, column=1, padx=(5, 10), pady=(5, 10), sticky='nsew')
 
         self.local_root = Config.get('local_repo_root')
-        self.client = ac.ArkClient()
+        self.client = ac.ArkClient(cache_dir=Config.get('client_cache_dir'))
         self.repo = None
+        self.repo_lock = threading.RLock()
+        """The lock to hold while reading or changing the repository out of the watcher thread."""
+        self.watcher:ArkRepoWatcher = None
+        self._save_index_id = None
         if not self.local_root or not os.path.isdir(self.local_root):
             self.local_root = None
         else:
             self.abstract.cmd_reload()
 
     def invoke_inspect(self, info:acp.FileInfoBase):
+        self.explorer.check_files([info])
         self.inspector.inspect(info)
         self.operation.inspect(info)
         self.explorer.treeview.refresh([info])
@@ -57,9 +70,52 @@ class ResourceManagerPage(ctk.CTkFrame, uic.HidableGridWidget):
         self.app.p_ar.abstract.cmd_reload()
         self.app.sidebar.activate_menu_button(2)
 
+    def get_asset_store(self):
+        if Config.get('asset_store_limit') > 0:
+            return ArkAssetStore(Config.get('asset_store_dir'), Config.get('asset_store_limit'))
+        return None
+
     def invoke_load_tree(self, repo:acp.AssetRepoBase):
-        self.repo = repo
-        self.explorer.load_tree(self.repo)
+        with self.repo_lock:
+            self.repo = repo
+            self.explorer.load_tree(self.repo)
+        self.invoke_watch(self.local_root if Config.get('local_repo_watch') else None)
+
+    def invoke_watch(self, root_dir:str):
+        if self.watcher and self.watcher.root_dir == root_dir:
+            return
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        if root_dir and os.path.isdir(root_dir):
+            self.watcher = ArkRepoWatcher(root_dir, self._on_repo_changed,
+                                          allow_polling=Config.get('local_repo_watch_polling'))
+            self.watcher.start()
+
+    def invoke_save_index(self):
+        # The files hashed in a short time are saved together
+        if self._save_index_id is None:
+            self._save_index_id = self.after(ResourceManagerPage.SAVE_INDEX_DELAY, self._save_index)
+
+    def _save_index(self):
+        self._save_index_id = None
+        if not self.repo_lock.acquire(blocking=False):
+            self.invoke_save_index() # A task is using the repository, so try again later
+            return
+        try:
+            if isinstance(self.repo, (acp.ArkLocalAssetsRepo, acp.ArkIntegratedAssetRepo)):
+                self.repo.save_index()
+        finally:
+            self.repo_lock.release()
+
+    def _on_repo_changed(self, names:"set[str]"):
+        # Called in the watcher thread, which waits here while a task is syncing,
+        # so the changes made by the sync are applied once after it
+        with self.repo_lock:
+            if isinstance(self.repo, (acp.ArkLocalAssetsRepo, acp.ArkIntegratedAssetRepo)):
+                with TestRT('repo_apply_changes'):
+                    added, removed, modified = self.repo.update_files(names)
+                    self.explorer.apply_changes(added, removed, modified)
 
 
 class _ResourceReloadTask(GUITaskBase):
@@ -83,9 +139,10 @@ class _ResourceReloadTask(GUITaskBase):
         self._manager.abstract.show_repo_res_version(self._manager.repo)
 
 class _ResourceSwitchLatestTask(GUITaskBase):
-    def __init__(self, manager:ResourceManagerPage):
+    def __init__(self, manager:ResourceManagerPage, checked:"list[str]"=None):
         super().__init__("正在切换到最新版本...")
         self._manager = manager
+        self._checked = checked
 
     def _run(self):
         self._manager.abstract.set_loading(True)
@@ -97,22 +154,54 @@ class _ResourceSwitchLatestTask(GUITaskBase):
             self.update(0.5, "正在获取资源列表")
             remote = self._manager.client.get_repo()
             self.update(0.8, "正在加载浏览视图")
-            if isinstance(self._manager.repo, acp.ArkIntegratedAssetRepo):
-                self._manager.repo = acp.ArkIntegratedAssetRepo(self._manager.repo.local, remote)
-            else:
-                self._manager.repo = acp.ArkIntegratedAssetRepo(self._manager.repo, remote)
-            self.update(0.9)
-            self._manager.explorer.load_tree(self._manager.repo)
+            with self._manager.repo_lock:
+                if isinstance(self._manager.repo, acp.ArkIntegratedAssetRepo):
+                    self._manager.repo = acp.ArkIntegratedAssetRepo(self._manager.repo.local, remote)
+                else:
+                    self._manager.repo = acp.ArkIntegratedAssetRepo(self._manager.repo, remote)
+                self.update(0.9)
+                self._manager.explorer.load_tree(self._manager.repo)
+                if self._checked:
+                    # The files checked just now have known MD5s, so their statuses are restored without hashing
+                    infos = [i for i in map(self._manager.repo.get_info, self._checked) if i is not None]
+                    self._manager.repo.get_statuses(infos)
+                    self._manager.explorer.refresh_files(infos)
 
     def _on_complete(self):
         self._manager.abstract.set_loading(False)
         self._manager.abstract.show_repo_res_version(self._manager.repo)
 
 
+class _ResourceSyncPlanTask(GUITaskBase):
+    def __init__(self, manager:ResourceManagerPage, subtree:str=None):
+        super().__init__("正在预估同步...")
+        self._manager = manager
+        self._subtree = subtree
+
+    def _run(self):
+        self._manager.abstract.set_loading(True)
+        if isinstance(self._manager.repo, acp.ArkIntegratedAssetRepo):
+            self.update(0.0, "正在初始化...")
+            def on_hashed(done:int, total:int):
+                self.update(done / total, f"正在计算变更 {done / total:.1%}")
+            types, pids = self._manager.abstract.get_sync_filter()
+            with self._manager.repo_lock:
+                plan = ArkSyncPlanner(self._manager.repo, self._manager.get_asset_store()) \
+                    .plan(self._subtree, types, pids, on_hashed)
+                self._manager.repo.save_index()
+                self._manager.explorer.refresh_files(plan.checked)
+            self._manager.abstract.show_sync_plan(plan)
+
+    def _on_complete(self):
+        self._manager.abstract.set_loading(False)
+
+
 class _ResourceSyncAllFileTask(GUITaskBase):
-    def __init__(self, manager:ResourceManagerPage):
+    def __init__(self, manager:ResourceManagerPage, subtree:str=None):
         super().__init__("正在同步文件...")
         self._manager = manager
+        self._subtree = subtree
+        self._checked:"list[str]" = None
 
     def _run(self):
         self._manager.abstract.set_loading(True)
@@ -121,33 +210,33 @@ class _ResourceSyncAllFileTask(GUITaskBase):
             STEP2_WEIGHT = 0.8
             # Step1
             self.update(0.0, "正在初始化...")
-            NEED_DELETE = (acp.FileStatus.DELETE,)
-            NEED_DOWNLOAD = (acp.FileStatus.ADD, acp.FileStatus.MODIFY)
-            NEED_SYNC = NEED_DELETE + NEED_DOWNLOAD
-            infos = self._manager.repo.infos
-            infos_len = len(infos)
-            filtered_infos = []
-            for i, info in enumerate(infos):
-                self.update(STEP1_WEIGHT * i / infos_len, f"正在计算变更 {i / infos_len:.1%}")
-                if info.status in NEED_SYNC:
-                    filtered_infos.append(info)
-            # Step2
-            filtered_infos_len = len(filtered_infos)
-            for i, info in enumerate(filtered_infos):
-                self.update(STEP1_WEIGHT + STEP2_WEIGHT * i / filtered_infos_len, f"已完成 {i}/{filtered_infos_len}")
-                if info.status in NEED_DELETE:
-                    print('D', info)
-                    FileSystem.rm(info.local.path)
-                elif info.status in NEED_DOWNLOAD:
-                    print(info)
-                    d = self._manager.client.get_asset(info.remote.data_name, unzip=True)
-                    FileSystem.mkdir_for(info.local.path)
-                    with open(info.local.path, 'wb') as f:
-                        f.write(d)
+            def on_hashed(done:int, total:int):
+                self.update(STEP1_WEIGHT * done / total, f"正在计算变更 {done / total:.1%}")
+            store = self._manager.get_asset_store()
+            types, pids = self._manager.abstract.get_sync_filter()
+            with self._manager.repo_lock:
+                plan = ArkSyncPlanner(self._manager.repo, store).plan(self._subtree, types, pids, on_hashed)
+                self._manager.explorer.refresh_files(plan.checked)
+                self._manager.abstract.show_sync_plan(plan)
+                self._checked = [i.name for i in plan.checked]
+                # Step2
+                selected = [i.name for i in self._manager.explorer.treeview.get_selected()]
+                downloader = ad.ArkDownloader(self._manager.client, store=store,
+                                              scheduler=ad.ArkDownloadScheduler.prefer(selected))
+                def on_progress(p:ad.ArkDownloadProgress):
+                    eta = p.eta
+                    self.update(STEP1_WEIGHT + STEP2_WEIGHT * p.ratio, f"已完成 {p.finished}/{p.total}" +
+                                (f"，剩余 {DurationFormatter.apply(int(eta))}" if eta is not None else ""))
+                try:
+                    failures = plan.execute(downloader, on_progress, self.is_cancelled)
+                finally:
+                    self._manager.repo.save_index()
+            if failures:
+                raise ad.ArkDownloadError(failures, f"Failed to sync {len(failures)} files")
 
     def _on_complete(self):
         self._manager.abstract.set_loading(False)
-        self._manager.abstract.cmd_switch_latest()
+        self._manager.abstract.cmd_switch_latest(self._checked)
 
 
 class _AbstractPanel(ctk.CTkFrame):
@@ -161,6 +250,8 @@ class _AbstractPanel(ctk.CTkFrame):
         self.info_local_ver.show("<未知>")
         self.info_remote_ver = uic.InfoLabelGroup(self, 2, 0, "目标资源版本号", tight=True)
         self.info_remote_ver.show("<未知>")
+        self.info_sync_plan = uic.InfoLabelGroup(self, 3, 0, "同步计划", tight=True)
+        self.info_sync_plan.show("<未预估>")
         self.btn_open = uic.OperationButton(self, 1, 1, "浏览", icon('repo_open'),
                                             command=self.cmd_open)
         self.btn_reload = uic.OperationButton(self, 2, 1, "重载", icon('repo_reload'),
@@ -171,8 +262,25 @@ class _AbstractPanel(ctk.CTkFrame):
                                                      **style('operation_button_info'))
         self.btn_sync = uic.OperationButton(self, 1, 3, "同步所有变更", icon('repo_sync'),
                                             command=self.cmd_sync_all_file)
+        speed_limit = Config.get('download_speed_limit')
+        self.speed_limits = {"不限速": 0, "限速 1 MB/s": 1048576, "限速 5 MB/s": 5242880, "限速 20 MB/s": 20971520}
+        if speed_limit not in self.speed_limits.values():
+            self.speed_limits[f"限速 {speed_limit} B/s"] = speed_limit
+        self.opt_speed_limit = ctk.CTkOptionMenu(self, values=list(self.speed_limits.keys()),
+                                                 command=self.cmd_set_speed_limit, **style('operation_button'))
+        self.opt_speed_limit.set([k for k, v in self.speed_limits.items() if v == speed_limit][0])
+        self.opt_speed_limit.grid(row=2, column=3, **style('operation_button_grid'))
+        ac.ArkClient.RATE_LIMITER.set_rate(speed_limit)
+        self.btn_plan = uic.OperationButton(self, 1, 4, "预估同步", icon('progress'),
+                                            command=self.cmd_plan_sync, **style('operation_button_info'))
+        self.sync_filters:"dict[str,tuple[list[str]|None,list[str]|None]]" = {"同步所有类型": (None, None)}
+        self.opt_sync_filter = ctk.CTkOptionMenu(self, values=list(self.sync_filters.keys()),
+                                                 command=lambda _:self.info_sync_plan.show("<未预估>"),
+                                                 **style('operation_button'))
+        self.opt_sync_filter.grid(row=2, column=4, **style('operation_button_grid'))
         self.progress = uic.ProgressBarGroup(self, 0, 0, grid_columnspan=1, init_visible=False)
-        self.btn_list = (self.btn_open, self.btn_reload, self.btn_switch_latest, self.btn_switch_manual, self.btn_sync)
+        self.btn_list = (self.btn_open, self.btn_reload, self.btn_switch_latest, self.btn_switch_manual, self.btn_sync,
+                         self.btn_plan)
         self.grid_columnconfigure((0), weight=1)
         self.grid_columnconfigure((1, 2, 3, 4), weight=0)
 
@@ -191,6 +299,33 @@ class _AbstractPanel(ctk.CTkFrame):
             local_ver = repo.local.detect_res_version()
             self.info_remote_ver.show(repo.remote.version.res, "<未知>")
         self.info_local_ver.show(local_ver, "<未知>")
+        self.show_sync_filters(repo)
+
+    def show_sync_filters(self, repo:acp.AssetRepoBase):
+        self.sync_filters = {"同步所有类型": (None, None)}
+        if isinstance(repo, acp.ArkIntegratedAssetRepo):
+            manifest = repo.remote.manifest
+            self.sync_filters.update({f"仅类型 {t}": ([t], None) for t in sorted(manifest.types)})
+            self.sync_filters.update({f"仅资源包 {p}": (None, [p]) for p in sorted(manifest.pids)})
+        self.opt_sync_filter.configure(values=list(self.sync_filters.keys()))
+        self.opt_sync_filter.set(list(self.sync_filters.keys())[0])
+        self.info_sync_plan.show("<未预估>")
+
+    def get_sync_filter(self):
+        return self.sync_filters.get(self.opt_sync_filter.get(), (None, None))
+
+    def show_sync_plan(self, plan:ArkSyncPlan):
+        if plan.is_empty():
+            self.info_sync_plan.show("无需同步")
+            return
+        text = f"删除 {len(plan.deletes)} 个，下载 {len(plan.downloads)} 个" \
+            f"（{acp.FileInfoBase.format_size(plan.data_size, 1)}，" \
+            f"解压后 {acp.FileInfoBase.format_size(plan.file_size, 1)}）"
+        if plan.downloads:
+            text += f"，需获取 {acp.FileInfoBase.format_size(plan.fetch_size, 1)}"
+            eta = plan.estimated_time
+            text += f"，预计 {DurationFormatter.apply(int(eta))}" if eta is not None else "，耗时未知"
+        self.info_sync_plan.show(text)
 
     def cmd_open(self):
         new_root = fd.askdirectory(mustexist=True)
@@ -203,8 +338,8 @@ class _AbstractPanel(ctk.CTkFrame):
         self.progress.bind_task(task)
         task.start()
 
-    def cmd_switch_latest(self):
-        task = _ResourceSwitchLatestTask(self.master)
+    def cmd_switch_latest(self, checked:"list[str]"=None):
+        task = _ResourceSwitchLatestTask(self.master, checked)
         self.progress.bind_task(task)
         task.start()
 
@@ -213,6 +348,16 @@ class _AbstractPanel(ctk.CTkFrame):
         self.progress.bind_task(task)
         task.start()
 
+    def cmd_plan_sync(self):
+        task = _ResourceSyncPlanTask(self.master)
+        self.progress.bind_task(task)
+        task.start()
+
+    def cmd_set_speed_limit(self, key:str):
+        speed_limit = self.speed_limits.get(key, 0)
+        ac.ArkClient.RATE_LIMITER.set_rate(speed_limit)
+        Config.set('download_speed_limit', speed_limit)
+
 
 class _ExplorerPanel(ctk.CTkFrame):
     master:ResourceManagerPage
@@ -221,18 +366,35 @@ class _ExplorerPanel(ctk.CTkFrame):
         super().__init__(master)
         self.title = ctk.CTkLabel(self, text="资源浏览器", image=icon('explorer'), **style('panel_title'))
         self.title.grid(row=0, column=0, **style('panel_title_grid'))
-        self.children_map:"dict[acp.FileInfoBase,set[acp.FileInfoBase]]" = None
+        self.search_modes = {"子串": ArkSearchIndex.MODE_SUBSTRING, "通配符": ArkSearchIndex.MODE_GLOB,
+                             "正则": ArkSearchIndex.MODE_REGEX}
+        self.search_frame = ctk.CTkFrame(self, fg_color='transparent')
+        self.search_frame.grid(row=0, column=0, padx=10, pady=10, sticky='ne')
+        self.entry_search = ctk.CTkEntry(self.search_frame, width=200, placeholder_text="搜索文件名（回车确认）",
+                                         **style('operation_button'))
+        self.entry_search.grid(row=0, column=0, padx=(0, 5))
+        self.entry_search.bind('<Return>', lambda _:self.cmd_search())
+        self.opt_search_mode = ctk.CTkOptionMenu(self.search_frame, width=80, values=list(self.search_modes.keys()),
+                                                 command=lambda _:self.cmd_search(), **style('operation_button'))
+        self.opt_search_mode.grid(row=0, column=1)
+        self.trie:acp.AssetPathTrie = None
+        self.rollup:ArkDirRollup = None
+        self.search_index = ArkSearchIndex()
+        self.searching = False
+        self._search_task:_ResourceSearchTask = None
         self.treeview:"uic.TreeviewFrame[acp.FileInfoBase]" = uic.TreeviewFrame(self, 1, 0, columns=3, empty_tip="列表为空")
         self.treeview.set_column(0, 300, "资源名称")
         self.treeview.set_column(1, 100, "状态")
         self.treeview.set_column(2, 100, "大小")
-        self.treeview.set_text_extractor(lambda x:x.basename)
-        self.treeview.set_icon_extractor(lambda x:file_icon(x.status))
-        self.treeview.set_value_extractor(lambda x:(acp.FileStatus.to_str(x.status), x.get_file_size_str()))
-        self.treeview.set_parent_extractor(lambda x:x.parent if x.parent and x.parent.name else None)
-        self.treeview.set_children_extractor(lambda x:self.children_map.get(x, None))
+        self.treeview.set_text_extractor(lambda x:x.name if self.searching else x.basename)
+        self.treeview.set_icon_extractor(lambda x:file_icon(x.cached_status))
+        self.treeview.set_value_extractor(self._get_values)
+        self.treeview.set_parent_extractor(self._get_parent)
+        self.treeview.set_children_extractor(lambda x:None if self.searching or self.trie is None else
+                                             self.trie.get_children(x))
         self.treeview.set_on_item_selected(self.master.invoke_inspect)
         self.treeview.set_on_item_double_click(self.master.invoke_inspect_alt)
+        self.treeview.set_on_item_opened(self.check_files)
         self.treeview.set_insert_order(lambda x:sorted(x, key=lambda y:(not isinstance(y, acp.DirFileInfo), y.name)))
         self.grid_rowconfigure((0), weight=0)
         self.grid_rowconfigure((1), weight=1)
@@ -241,11 +403,168 @@ class _ExplorerPanel(ctk.CTkFrame):
     def load_tree(self, repo:acp.AssetRepoBase):
         with TestRT('repo_load_tree'):
             # Clear the current items
+            self.cancel_search()
+            self.searching = False
             self.treeview.clear()
             # Load the new items
             if repo is not None:
-                self.children_map = self.master.repo.get_children_map()
-                self.treeview.insert(list(self.children_map[acp.DirFileInfo('')]))
+                # Show the top-level directories first, since building the path index of a large repository
+                # takes a while, then show the whole tree once the index is built
+                self.trie = None
+                self.rollup = None
+                self.treeview.insert(repo.get_top_dirs())
+                trie = repo.get_trie()
+                rollup = ArkDirRollup(trie)
+                self.treeview.clear()
+                self.trie = trie
+                self.rollup = rollup
+                self.check_files(self.trie.get_children(self.trie.root))
+                self.treeview.insert(list(self.trie.get_children(self.trie.root)))
+                self.search_index.sync(repo.infos)
+            else:
+                self.search_index.sync([])
+
+    def apply_changes(self, added:"list[acp.FileInfoBase]", removed:"list[acp.FileInfoBase]",
+                      modified:"list[acp.FileInfoBase]"):
+        for i in removed:
+            self.search_index.remove(i)
+        for i in added + modified:
+            self.search_index.add(i)
+        if self.trie is None:
+            return
+        # Delete the removed files, and the directories that become empty
+        deleted = list(removed)
+        for i in removed:
+            if self.rollup:
+                self.rollup.remove(i)
+            parent = i.name.rpartition(acp.FileInfoBase.SEP)[0]
+            while parent and self.trie.get_dir(parent) is None:
+                deleted.append(acp.DirFileInfo(parent))
+                parent = parent.rpartition(acp.FileInfoBase.SEP)[0]
+        self.treeview.delete(deleted)
+        if isinstance(self.master.repo, acp.ArkIntegratedAssetRepo):
+            self.master.repo.get_statuses([i for i in added + modified if isinstance(i, acp.ArkIntegratedFileInfo)])
+            self.master.invoke_save_index()
+        self.refresh_files(added + modified, removed)
+        if not self.searching:
+            self.treeview.insert_new(added)
+
+    def check_files(self, infos:"list[acp.FileInfoBase]"):
+        """Computes the statuses of the given files in a batch, then updates the rollups and the displayed rows.
+        Nothing is computed while a task is using the repository, so the interface is never blocked by it."""
+        repo = self.master.repo
+        files = [i for i in infos if isinstance(i, acp.ArkIntegratedFileInfo)]
+        if not files or not isinstance(repo, acp.ArkIntegratedAssetRepo):
+            return
+        if not self.master.repo_lock.acquire(blocking=False):
+            return
+        try:
+            repo.get_statuses(files)
+            self.refresh_files(files)
+        finally:
+            self.master.repo_lock.release()
+        self.master.invoke_save_index()
+
+    def refresh_files(self, infos:"list[acp.FileInfoBase]", removed:"list[acp.FileInfoBase]"=()):
+        """Updates the rollups of the given changed files, then refreshes the displayed rows of them and
+        the directories containing them or the given removed files."""
+        if self.trie is None:
+            return
+        if self.rollup:
+            for i in infos:
+                self.rollup.update(i)
+        rows = set(infos)
+        for i in [*infos, *removed]:
+            parent = i.name.rpartition(acp.FileInfoBase.SEP)[0]
+            while parent:
+                rows.add(acp.DirFileInfo(parent))
+                parent = parent.rpartition(acp.FileInfoBase.SEP)[0]
+        inserted = self.treeview.iid2item.values()
+        self.treeview.refresh([self.treeview.iid2item.get_value(self.treeview.iid2item.get_key(i))
+                               for i in rows if i in inserted])
+
+    def cmd_search(self):
+        if self.trie is None:
+            return
+        self.cancel_search()
+        query = self.entry_search.get()
+        if not query:
+            # Restore the tree view of the repository
+            self.searching = False
+            self.treeview.clear()
+            self.treeview.insert(list(self.trie.get_children(self.trie.root)))
+            return
+        self._search_task = _ResourceSearchTask(self.master, query, self.search_modes[self.opt_search_mode.get()])
+        self.master.abstract.progress.bind_task(self._search_task)
+        self._search_task.start()
+
+    def cancel_search(self):
+        if self._search_task and not self._search_task.is_completed():
+            self._search_task.cancel()
+        self._search_task = None
+
+    def _get_values(self, info:acp.FileInfoBase):
+        if isinstance(info, acp.DirFileInfo):
+            stats = self.rollup.get(info) if self.rollup else None
+            if stats is None:
+                return ("", "")
+            changed = stats.changed_count
+            return (f"{changed} 项变更" if changed else "", acp.FileInfoBase.format_size(stats.total_size))
+        return (acp.FileStatus.to_str(info.cached_status), info.get_file_size_str())
+
+    def _get_parent(self, info:acp.FileInfoBase):
+        if self.searching or self.trie is None:
+            return None # The results are listed flat, or the path index is not ready yet
+        parent = self.trie.get_parent(info)
+        return parent if parent and parent.name else None
+
+
+class _ResourceSearchTask(GUITaskBase):
+    BATCH_SIZE = 100
+    MAX_RESULTS = 2000
+
+    def __init__(self, manager:ResourceManagerPage, query:str, mode:int):
+        super().__init__("正在搜索文件...")
+        self._manager = manager
+        self._query = query
+        self._mode = mode
+
+    def _run(self):
+        explorer = self._manager.explorer
+        self.update(0.1, "正在搜索...")
+        try:
+            results = explorer.search_index.search(self._query, self._mode)
+        except re.error:
+            self.update(None, "无效的正则表达式")
+            return
+        # Results are streamed into the treeview in batches, so the first ones are shown without waiting the rest
+        batch = []
+        count = 0
+        with TestRT('repo_search'):
+            explorer.searching = True
+            explorer.treeview.clear()
+            for i in results:
+                if self.is_cancelled():
+                    return
+                batch.append(i)
+                count += 1
+                if len(batch) >= _ResourceSearchTask.BATCH_SIZE or count >= _ResourceSearchTask.MAX_RESULTS:
+                    self._insert(batch)
+                    batch = []
+                    self.update(0.1 + 0.9 * count / _ResourceSearchTask.MAX_RESULTS, f"已找到 {count} 个文件")
+                if count >= _ResourceSearchTask.MAX_RESULTS:
+                    break
+            if batch and not self.is_cancelled():
+                self._insert(batch)
+        if count >= _ResourceSearchTask.MAX_RESULTS:
+            self.update(1.0, f"仅显示前 {count} 个文件")
+        else:
+            self.update(1.0, f"共找到 {count} 个文件")
+
+    def _insert(self, batch:"list[acp.FileInfoBase]"):
+        # The cached statuses are shown, since hashing the results would make the searching slow
+        with self._manager.repo_lock:
+            self._manager.explorer.treeview.insert(batch)
 
 
 class _InspectorPanel(ctk.CTkFrame):
@@ -280,9 +599,24 @@ class _InspectorPanel(ctk.CTkFrame):
             self.info_digest_local.show(info.md5, "<未知>")
             self.info_digest_remote.show(None)
         elif isinstance(info, acp.DirFileInfo):
-            self.info_status.show("文件夹")
-            self.info_size_local.show(None)
-            self.info_size_remote.show(None)
+            rollup = self.master.explorer.rollup
+            stats = rollup.get(info) if rollup else None
+            if stats is None:
+                self.info_status.show("文件夹")
+                self.info_size_local.show(None)
+                self.info_size_remote.show(None)
+            else:
+                status = f"文件夹，{stats.file_count} 个文件"
+                if stats.changed_count:
+                    status += f"，{stats.changed_count} 项变更，" \
+                        f"待下载 {acp.FileInfoBase.format_size(stats.download_size, 1)}"
+                unchecked = stats.status_counts[acp.FileStatus.UNCHECKED]
+                if unchecked and isinstance(self.master.repo, acp.ArkIntegratedAssetRepo):
+                    status += f"，{unchecked} 个未检查"
+                self.info_status.show(status)
+                self.info_size_local.show(acp.FileInfoBase.format_size(stats.local_size, 1))
+                self.info_size_remote.show(acp.FileInfoBase.format_size(stats.remote_size, 1)
+                                           if isinstance(self.master.repo, acp.ArkIntegratedAssetRepo) else None)
             self.info_digest_local.show(None)
             self.info_digest_remote.show(None)
 
@@ -307,7 +641,12 @@ class _OperationPanel(ctk.CTkFrame):
             if not isinstance(info, acp.DirFileInfo) and \
                 info.status in (acp.FileStatus.ADD, acp.FileStatus.DELETE, acp.FileStatus.MODIFY):
                 self.btn_sync.set_visible(True)
+                self.btn_sync.configure(text="同步此文件")
                 self.btn_sync.set_command(lambda:self.cmd_sync(info))
+            elif isinstance(info, acp.DirFileInfo) and isinstance(self.master.repo, acp.ArkIntegratedAssetRepo):
+                self.btn_sync.set_visible(True)
+                self.btn_sync.configure(text="同步此文件夹")
+                self.btn_sync.set_command(lambda:self.cmd_sync_dir(info))
             else:
                 self.btn_sync.set_visible(False)
                 self.btn_sync.set_command(None)
@@ -322,6 +661,11 @@ class _OperationPanel(ctk.CTkFrame):
                 self.btn_goto.set_visible(False)
                 self.btn_goto.set_command(None)
 
+    def cmd_sync_dir(self, info:acp.DirFileInfo):
+        task = _ResourceSyncAllFileTask(self.master, info.name)
+        self.master.abstract.progress.bind_task(task)
+        task.start()
+
     def cmd_sync(self, info:acp.FileInfoBase):
         if isinstance(info, acp.ArkIntegratedFileInfo):
             task = _ResourceSyncFileTask(self.master, info)
@@ -339,16 +683,20 @@ class _ResourceSyncFileTask(GUITaskBase):
         self._manager.abstract.set_loading(True)
         if isinstance(self._manager.repo, acp.ArkIntegratedAssetRepo) and \
             isinstance(self._info, acp.ArkIntegratedFileInfo):
-            if self._info.status == acp.FileStatus.DELETE:
-                self.update(0.2, "正在删除...")
-                FileSystem.rm(self._info.local.path)
-            elif self._info.status in [acp.FileStatus.ADD, acp.FileStatus.MODIFY]:
-                self.update(0.2, "正在下载...")
-                d = self._manager.client.get_asset(self._info.remote.data_name, unzip=True)
-                self.update(0.8, "正在写入...")
-                FileSystem.mkdir_for(self._info.local.path)
-                with open(self._info.local.path, 'wb') as f:
-                    f.write(d)
+            with self._manager.repo_lock:
+                if self._info.status == acp.FileStatus.DELETE:
+                    self.update(0.2, "正在删除...")
+                    self._info.local.delete()
+                elif self._info.status in [acp.FileStatus.ADD, acp.FileStatus.MODIFY]:
+                    self.update(0.2, "正在下载...")
+                    self._manager.client.download_asset(self._info.remote.data_name, self._info.local.path,
+                                                        self._info.remote.data_size, self._info.remote.md5)
+                    self._info.mark_verified()
+                info = self._manager.repo.update(self._info.name)
+                if info is not None:
+                    self._manager.explorer.search_index.add(info)
+                    self._manager.explorer.refresh_files([info])
+                self._manager.repo.save_index()
             self.update(0.9, "正在校验...")
             self._manager.invoke_inspect(self._info)
 
@@ -16,8 +16,8 @@ class DurationFormatter:
         s = int(sec % 60)
         ms = round((sec - int(sec)) * 1000) if isinstance(sec, float) else None
         if h != 0:
-            return f'{h}:{m:02}:{s:02}' + f'.{ms:03}' if isinstance(sec, float) else ''
-        return f'{m:02}:{s:02}' + f'.{ms:03}' if isinstance(sec, float) else ''
+            return f'{h}:{m:02}:{s:02}' + (f'.{ms:03}' if isinstance(sec, float) else '')
+        return f'{m:02}:{s:02}' + (f'.{ms:03}' if isinstance(sec, float) else '')
 
 
 class TestRT(ContextDecorator):
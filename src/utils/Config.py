@@ -37,6 +37,13 @@ class Config():
     __file_encoding = 'UTF-8'
     __default_config = {
         'local_repo_root': None,
+        'local_repo_watch': True,
+        'local_repo_watch_polling': False,
+        'client_cache_dir': "ArkStudioCache",
+        'download_speed_limit': 0,
+        'download_throughput': 0,
+        'asset_store_dir': "ArkStudioStore",
+        'asset_store_limit': 4294967296,
         'log_file': "ArkStudioLogs.log",
         'log_level': Logger.LV_INFO,
         'performance_level': PerformanceLevel.STANDARD
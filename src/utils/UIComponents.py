@@ -168,6 +168,7 @@ class TreeviewFrame(ctk.CTkFrame, HidableGridWidget, Generic[_ITEM_TYPE]):
         self._children_of:"Callable[[_ITEM_TYPE],list[_ITEM_TYPE]]" = lambda _:None
         self._on_item_selected:"Callable[[_ITEM_TYPE],None]" = lambda _:None
         self._on_item_double_click:"Callable[[_ITEM_TYPE],None]" = lambda _:None
+        self._on_item_opened:"Callable[[list[_ITEM_TYPE]],None]" = lambda _:None
         self._insert_sorter:"Callable[[list[_ITEM_TYPE]],list[_ITEM_TYPE]]" = lambda x:x
         # Runtime variables
         self.treeview:ttk.Treeview = None
@@ -223,10 +224,23 @@ class TreeviewFrame(ctk.CTkFrame, HidableGridWidget, Generic[_ITEM_TYPE]):
         """Sets a callback that will be called when an item has been double clicked."""
         self._on_item_double_click = consumer
 
+    def set_on_item_opened(self, consumer:"Callable[[list[_ITEM_TYPE]],None]"):
+        """Sets a callback that will be called with the children of an item before they are inserted,
+        when the item has been expanded. Valid only in tree mode."""
+        if not self._tree_mode:
+            raise RuntimeError("Only supported in tree mode")
+        self._on_item_opened = consumer
+
     def set_insert_order(self, sorter:"Callable[[list[_ITEM_TYPE]],list[_ITEM_TYPE]]"):
         """Sets a sorter that sorts the item list to be inserted."""
         self._insert_sorter = sorter
 
+    def get_selected(self) -> "list[_ITEM_TYPE]":
+        """Gets the items that are selected currently."""
+        if not self._inited:
+            return []
+        return [self.iid2item.get_value(i) for i in self.treeview.selection() if i in self.iid2item]
+
     def clear(self):
         """Clears the whole treeview and resets all data. Must be invoked before any `insert` action."""
         # Treeview reset
@@ -252,6 +266,39 @@ class TreeviewFrame(ctk.CTkFrame, HidableGridWidget, Generic[_ITEM_TYPE]):
         for i in self._insert_sorter(items):
             self._insert_one(i)
 
+    def insert_new(self, items:"list[_ITEM_TYPE]"):
+        """Inserts the items that are newly created, appending each one to its parent.
+        In tree mode, an item under a collapsed parent is not inserted until the parent is expanded."""
+        if not self._inited:
+            return
+        inserted = self.iid2item.values()
+        for i in items:
+            # Find the topmost ancestor that is not inserted yet
+            node, parent = i, self._parent_of(i)
+            while parent and parent not in inserted:
+                node, parent = parent, self._parent_of(parent)
+            if node in inserted:
+                continue
+            if not parent:
+                self._insert_one(node)
+                continue
+            iid = self.iid2item.get_key(parent)
+            children = self.treeview.get_children(iid)
+            if not children:
+                # Insert a pre-contained item so that the parent can be expanded
+                self.treeview.insert(iid, tk.END, text="")
+            elif children[0] in self.iid2item:
+                self._insert_one(node)
+
+    def delete(self, items:"list[_ITEM_TYPE]"):
+        """Deletes the given items with their descendants. The items not inserted are ignored."""
+        if not self._inited:
+            return
+        for i in items:
+            iid = self.iid2item.get_key(i)
+            if iid is not None:
+                self._delete_one(iid)
+
     def refresh(self, items:"list[_ITEM_TYPE]"):
         """Updates the given items by refreshing their text, image and column values."""
         for i in items:
@@ -324,6 +371,7 @@ class TreeviewFrame(ctk.CTkFrame, HidableGridWidget, Generic[_ITEM_TYPE]):
         # Insert the children of this item
         children = self._children_of(item)
         if children:
+            self._on_item_opened(children)
             self.insert(children)
         self.treeview.configure(cursor='arrow')
 